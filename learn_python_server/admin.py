@@ -2,11 +2,9 @@
 Admin interface for all models in etc_player.
 """
 import os
-from pathlib import Path
 from typing import Any
 
 from django import forms
-from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.forms import UserChangeForm, UserCreationForm
@@ -85,6 +83,9 @@ class EnrollmentInline(admin.TabularInline):
     readonly_fields = ('student', 'joined', 'last_activity')
     #raw_id_fields = ('repository',)
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
+        return super().get_queryset(request).select_related('student', 'course', 'repository')
+
 
 # a custom admin for courses
 @admin.register(Course)
@@ -99,15 +100,26 @@ class CourseAdmin(admin.ModelAdmin):
     change_form_template = 'admin/course_change_form.html'
 
     def enrollment(self, obj):
-        return obj.enrollments.count()
+        return obj.num_enrollments
+
+    enrollment.admin_order_field = 'num_enrollments'
     
     def repo(self, obj):
         # return a link to obj.docs.url
         return format_html('<a href="{url}" target="_blank">{url}</a>', url=obj.repository) if obj.repository else None
 
     def docs(self, obj):
-        # return a link to obj.docs.url
-        return format_html('<a href="{url}" target="_blank">docs</a>', url=obj.docs.url) if obj.docs else None
+        # link to the view that redirects to the latest build, so we only need
+        # to know if there is one
+        return format_html(
+            '<a href="{url}" target="_blank">docs</a>',
+            url=reverse('course_docs', kwargs={'course': obj.pk})
+        ) if obj.latest_docs_id else None
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
+        return super().get_queryset(request).select_related(
+            'repository'
+        ).with_latest_docs().annotate(num_enrollments=Count('enrollments', distinct=True))
 
     def get_urls(self):
         urls = super().get_urls()
@@ -192,12 +204,13 @@ class CourseRepositoryVersionAdmin(ReadOnlyMixin, admin.TabularInline):
     model = CourseRepositoryVersion
     ordering = ('-timestamp',)
     readonly_fields = ('timestamp', 'repository', 'git_branch', 'git_hash', 'commit_count')
+    exclude = ('structure',)
 
     def repo(self, obj):
         return obj.repository.uri
     
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).select_related('repository')
+        return super().get_queryset(request).select_related('repository').defer('structure')
 
 
 @admin.register(DocBuild)
@@ -287,6 +300,9 @@ class CourseInlineAdmin(ReadOnlyMixin, admin.TabularInline):
     model = Course
     extra = 0
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
+        return super().get_queryset(request).select_related('repository', 'tutor_key')
+
 
 @admin.register(CourseRepository)
 class CourseRepositoryAdmin(admin.ModelAdmin):
@@ -296,9 +312,6 @@ class CourseRepositoryAdmin(admin.ModelAdmin):
 
     inlines = [CourseInlineAdmin, CourseRepositoryVersionAdmin]
 
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).prefetch_related('versions', 'courses')
-
 
 @admin.register(TutorExchange)
 class TutorExchangeAdmin(ReadOnlyMixin, admin.ModelAdmin):
@@ -413,11 +426,15 @@ class TutorEngagementAdmin(ReadOnlyMixin, admin.ModelAdmin):
             return obj.stop - obj.timestamp
         
     def sessions(self, obj):
-        return obj.sessions.count()
+        return obj.num_sessions
+
+    sessions.admin_order_field = 'num_sessions'
 
     def tasks(self, obj):
         return obj.tasks
 
+    tasks.admin_order_field = 'tasks'
+
     inlines = [TutorSessionInlineAdmin,]
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
@@ -425,7 +442,11 @@ class TutorEngagementAdmin(ReadOnlyMixin, admin.ModelAdmin):
             'repository',
             'repository__student',
             'log'
-        ).prefetch_related('sessions').annotate(tasks=Count('sessions__assignment', unique=True))
+        ).annotate(
+            # counted in the list query instead of fetching every session
+            num_sessions=Count('sessions', distinct=True),
+            tasks=Count('sessions__assignment', distinct=True)
+        )
 
     def has_delete_permission(self, request, obj=None):
         return True
@@ -517,7 +538,7 @@ class LogEventAdmin(ReadOnlyMixin, admin.ModelAdmin):
     def log_file(self, obj):
         return format_html(
             '<a href="{}">{}</a>',
-            Path(settings.MEDIA_URL) / obj.log.log.name,
+            obj.log.log.url,
             os.path.basename(obj.log.log.name)
         )
     
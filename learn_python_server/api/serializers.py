@@ -1,5 +1,4 @@
 import gzip
-import os
 import re
 from io import BytesIO
 from uuid import UUID
@@ -24,10 +23,9 @@ from learn_python_server.models import (
     Module
 )
 from learn_python_server.utils import (
-    calculate_sha256,
     headers_match,
     is_gzip,
-    num_lines,
+    sha256_and_num_lines,
 )
 from rest_framework.serializers import (
     CharField,
@@ -211,14 +209,15 @@ class LogFileSerializer(ModelSerializer):
 
             # if the log file is not created, the in memory uploaded file is
             # never saved which is what we want
+            sha256_bytes, lines = sha256_and_num_lines(log)
             log_file, created = LogFile.objects.get_or_create(
-                sha256_hash=calculate_sha256(log),
+                sha256_bytes=sha256_bytes,
                 repository=self.context['request'].user.authorized_repository,
                 defaults={
                     **validated_data,
                     'type': type,
                     'date': date,
-                    'num_lines': num_lines(log)
+                    'num_lines': lines
                 }
             )
 
@@ -240,20 +239,22 @@ class LogFileSerializer(ModelSerializer):
                     Q(type=type) & 
                     (Q(date=log_file.date) | Q(date__isnull=True))
                 ).exclude(pk=log_file.pk).select_for_update():
-                    if not os.path.exists(other_log.log.path):
+                    if not other_log.log_exists:
                         # some weird polymorphic delete bug
                         TestEvent.objects.filter(log=other_log).delete()
                         other_log.delete()
                         continue
                     with (
-                        gzip.open(other_log.log.path, 'rb') as file1, 
-                        gzip.open(log_file.log.path, 'rb') as file2
+                        other_log.log.open('rb') as raw1,
+                        log_file.log.open('rb') as raw2,
+                        gzip.open(raw1, 'rb') as file1, 
+                        gzip.open(raw2, 'rb') as file2
                     ):
                         if headers_match(file1, file2, min(other_log.num_lines, log_file.num_lines)):
                             if other_log.num_lines > log_file.num_lines:
                                 other_log, log_file = log_file, other_log
-                            if os.path.exists(other_log.log.path):
-                                os.remove(other_log.log.path)
+                            if other_log.log_exists:
+                                other_log.log.delete(save=False)
 
                             TestEvent.objects.filter(log=other_log).delete()
                             other_log.delete()
@@ -193,7 +193,8 @@ class ModuleViewSet(ListAPIView):
             else:
                 qry = Q(uri=uri)
             try:
-                return Module.objects.filter(
+                # the serializer only uses Module's own fields - don't fetch subclasses
+                return Module.objects.non_polymorphic().filter(
                     repository=CourseRepository.objects.get(qry)
                 ).prefetch_related('assignments')
             except CourseRepository.DoesNotExist:
@@ -1,9 +1,11 @@
+import os
+
 from django.apps import AppConfig
+from django.conf import settings
 from django.db import transaction
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
 from learn_python_server.utils import is_in_transaction
-import os
 
 
 class LearnPythonServerConfig(AppConfig):
@@ -12,9 +14,12 @@ class LearnPythonServerConfig(AppConfig):
 
     def ready(self):
         from learn_python_server.models import LogFile
+        if getattr(settings, 'TMP_DIR', None):
+            os.makedirs(settings.TMP_DIR, exist_ok=True)
+
         @receiver(post_delete, sender=LogFile)
         def delete_file(sender, instance, **kwargs):
-            if instance.log and os.path.exists(instance.log.path):
+            if instance.log_exists:
                 # Delay the file delete until after the transaction commits
                 if is_in_transaction():
                     transaction.on_commit(lambda: instance.log.delete(False))
@@ -13,7 +13,9 @@ class RepositorySignatureAuthentication(BaseAuthentication):
             repository = normalize_repository(repository)
 
             try:
-                repo, created = StudentRepository.objects.get_or_create(uri=repository)
+                repo, created = StudentRepository.objects.for_authentication().get_or_create(
+                    uri=repository
+                )
                 if created:
                     repo.synchronize_keys()
                 if repo.verify(request):
@@ -94,6 +94,8 @@ class Command(BaseCommand):
         events = 0
         course = log_file.repository.enrollment.course
         runner_stack = []
+        # a test log reports the same handful of tests over and over
+        assignments = {}
         for log_record in log_file:
             if (
                 log_record and 
@@ -127,10 +129,13 @@ class Command(BaseCommand):
                                 )
                         continue
                     if 'result' in log_record and 'identifier' in log_record:
-                        log_record['assignment'] = Assignment.objects.filter(
-                            Q(module__repository__courses=course) &
-                            Q(identifier=log_record['identifier'])
-                        ).distinct().first()
+                        identifier = log_record['identifier']
+                        if identifier not in assignments:
+                            assignments[identifier] = Assignment.objects.filter(
+                                Q(module__repository__courses=course) &
+                                Q(identifier=identifier)
+                            ).distinct().first()
+                        log_record['assignment'] = assignments[identifier]
                         if log_record['assignment']:
                             EventType = TestEvent
                             if runner_stack:
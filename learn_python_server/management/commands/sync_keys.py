@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from learn_python_server.models import StudentRepository
+
+
+class Command(BaseCommand):
+    help = (
+        'Synchronize the public keys of student repositories with the keys committed to '
+        'the repositories. Repositories are cloned in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'repositories',
+            metavar='R',
+            type=int,
+            nargs='*',
+            help='The ids of the student repositories to synchronize. Defaults to all of them.'
+        )
+
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            dest='jobs',
+            default=8,
+            type=int,
+            help='The number of repositories to clone at once. Defaults to 8.'
+        )
+
+    def handle(self, **options):
+        repositories = StudentRepository.objects.all()
+        if options['repositories']:
+            repositories = repositories.filter(id__in=options['repositories'])
+
+        for repository, keys, err in StudentRepository.map_parallel(
+            repositories,
+            'synchronize_keys',
+            jobs=options['jobs']
+        ):
+            if err:
+                self.stderr.write(
+                    self.style.ERROR(('Unable to synchronize keys for {}: {}').format(repository, err))
+                )
+                continue
+            all_keys, new_keys, removed = keys
+            self.stdout.write(
+                self.style.SUCCESS(('{}: {} keys, {} added, {} removed').format(
+                    repository, len(all_keys), len(new_keys), len(removed)
+                ))
+            )
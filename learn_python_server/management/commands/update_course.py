@@ -1,6 +1,8 @@
 import re
 import readline  # don't remove, this helps input() work better
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 from django.conf import settings
@@ -17,7 +19,7 @@ from learn_python_server.models import (
     DocBuild,
     Module,
 )
-from learn_python_server.utils import TemporaryDirectory
+from learn_python_server.utils import TemporaryDirectory, link_or_copy
 
 
 class Command(BaseCommand):
@@ -100,12 +102,13 @@ class Command(BaseCommand):
 
             with repository:
 
+                snapshot = repository.snapshot()
                 repo_version, new_version = CourseRepositoryVersion.objects.get_or_create(
                     repository=repository,
-                    git_hash=repository.commit_hash(),
-                    git_branch=repository.cloned_branch(),
+                    git_hash=snapshot['hash'],
+                    git_branch=snapshot['branch'],
                     defaults={
-                        'commit_count': repository.commit_count()
+                        'commit_count': snapshot['count']
                     }
                 )
 
@@ -118,7 +121,13 @@ class Command(BaseCommand):
                 if not doc_html.is_dir():
                     raise CommandError(('Could not find built documentation in {}').format(doc_html))
                 
-                course_structure = repository.course_structure()
+                # the structure is fixed for a given commit and getting it means a
+                # sphinx run, so keep it on the version
+                course_structure = repo_version.structure
+                if course_structure is None:
+                    course_structure = repository.course_structure()
+                    repo_version.structure = course_structure
+                    repo_version.save(update_fields=['structure'])
 
                 def list_to_str(list_or_str):
                     if not list_or_str:
@@ -132,7 +141,7 @@ class Command(BaseCommand):
                     for module, tasks in course_structure.items():
                         number = re.search(r'(?P<number>\d+)?$', module).groupdict().get('number', None)
                         number = int(number) if number else None
-                        mod_obj, mod_is_new = Module.objects.get_or_create(
+                        mod_obj, mod_is_new = Module.objects.non_polymorphic().get_or_create(
                             name=module,
                             repository=repository,
                             defaults={
@@ -178,7 +187,9 @@ class Command(BaseCommand):
                         removed_task.ended = repo_version
                         removed_task.save()
 
-                for removed_module in Module.objects.filter(repository=repository).exclude(pk__in=modules):
+                for removed_module in Module.objects.non_polymorphic().filter(
+                    repository=repository
+                ).exclude(pk__in=modules):
                     self.stdout.write(('Removing module {}').format(removed_module))
                     removed_module.ended = repo_version
                     removed_module.save()
@@ -187,11 +198,27 @@ class Command(BaseCommand):
                     repository=repo_version
                 )
                 if not doc_build.path.is_dir() or new_build:
-                    shutil.copytree(doc_html, doc_build.path, dirs_exist_ok=True)
+                    shutil.copytree(
+                        doc_html,
+                        doc_build.path,
+                        dirs_exist_ok=True,
+                        copy_function=link_or_copy
+                    )
 
                 # delete older doc builds for this repo
-                for old_build in DocBuild.objects.filter(repository__repository=repository).exclude(pk=doc_build.pk):
+                old_builds = list(
+                    DocBuild.objects.filter(
+                        repository__repository=repository
+                    ).exclude(pk=doc_build.pk).select_related('repository__repository')
+                )
+                for old_build in old_builds:
                     self.stdout.write(('Deleting old build {}').format(old_build))
-                    if Path(old_build.path).is_dir():
-                        shutil.rmtree(old_build.path)
-                    old_build.delete()
+                DocBuild.objects.filter(pk__in=[old_build.pk for old_build in old_builds]).delete()
+
+                # the build trees are only removed once the transaction commits
+                old_paths = [old_build.path for old_build in old_builds]
+                def remove_old_builds():
+                    with ThreadPoolExecutor(max_workers=4) as pool:
+                        list(pool.map(partial(shutil.rmtree, ignore_errors=True), old_paths))
+                if old_paths:
+                    transaction.on_commit(remove_old_builds)
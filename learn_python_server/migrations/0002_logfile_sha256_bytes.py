@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-15 14:12
+
+import django.core.validators
+from django.db import migrations, models
+
+from learn_python_server.migrations._bulk import paged_bulk_update
+
+
+def hex_to_bytes(apps, schema_editor):
+    LogFile = apps.get_model('learn_python_server', 'LogFile')
+
+    def update(log_file):
+        log_file.sha256_bytes = bytes.fromhex(log_file.sha256_hash)
+
+    paged_bulk_update(
+        LogFile.objects.only('pk', 'sha256_hash'),
+        ['sha256_bytes'],
+        update
+    )
+
+
+def bytes_to_hex(apps, schema_editor):
+    LogFile = apps.get_model('learn_python_server', 'LogFile')
+
+    def update(log_file):
+        log_file.sha256_hash = bytes(log_file.sha256_bytes).hex()
+
+    paged_bulk_update(
+        LogFile.objects.only('pk', 'sha256_bytes'),
+        ['sha256_hash'],
+        update
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn_python_server', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logfile',
+            name='sha256_bytes',
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+        # relax the old column so it can be re-added empty when reversing
+        migrations.AlterField(
+            model_name='logfile',
+            name='sha256_hash',
+            field=models.CharField(max_length=64, null=True, validators=[django.core.validators.MinLengthValidator(64), django.core.validators.MaxLengthValidator(64)]),
+        ),
+        migrations.RunPython(hex_to_bytes, bytes_to_hex),
+        migrations.AlterField(
+            model_name='logfile',
+            name='sha256_bytes',
+            field=models.BinaryField(help_text='The raw SHA-256 digest of the uploaded log file.', max_length=32, validators=[django.core.validators.MinLengthValidator(32), django.core.validators.MaxLengthValidator(32)]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='logfile',
+            unique_together={('repository', 'sha256_bytes')},
+        ),
+        migrations.AlterIndexTogether(
+            name='logfile',
+            index_together={('repository', 'sha256_bytes')},
+        ),
+        migrations.RemoveField(
+            model_name='logfile',
+            name='sha256_hash',
+        ),
+    ]
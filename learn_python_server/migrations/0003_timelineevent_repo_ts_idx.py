@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 15:03
+
+from django.db import migrations, models
+
+from learn_python_server.migrations._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('learn_python_server', '0002_logfile_sha256_bytes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='timelineevent',
+            index=models.Index(fields=['repository', '-timestamp'], name='timeline_repo_ts_idx'),
+        ),
+    ]
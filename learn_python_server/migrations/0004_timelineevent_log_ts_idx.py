@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-15 15:31
+
+from django.db import migrations, models
+
+from learn_python_server.migrations._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('learn_python_server', '0003_timelineevent_repo_ts_idx'),
+    ]
+
+    operations = [
+        # timeline_log_ts_idx below replaces these for the per log lookups
+        migrations.AlterIndexTogether(
+            name='timelineevent',
+            index_together=set(),
+        ),
+        AddIndexConcurrently(
+            model_name='timelineevent',
+            index=models.Index(fields=['log', 'timestamp'], name='timeline_log_ts_idx'),
+        ),
+    ]
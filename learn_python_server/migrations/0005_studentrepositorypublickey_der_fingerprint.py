@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-15 17:20
+
+import hashlib
+
+import django.core.validators
+from cryptography.hazmat.primitives import serialization
+from django.db import migrations, models
+
+from learn_python_server.migrations._bulk import paged_bulk_update
+
+
+def pem_to_der(apps, schema_editor):
+    StudentRepositoryPublicKey = apps.get_model('learn_python_server', 'StudentRepositoryPublicKey')
+
+    def update(key):
+        key.key = serialization.load_pem_public_key(bytes(key.key)).public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        key.fingerprint = hashlib.sha256(key.key).digest()
+
+    paged_bulk_update(
+        StudentRepositoryPublicKey.objects.only('pk', 'key'),
+        ['key', 'fingerprint'],
+        update
+    )
+
+
+def der_to_pem(apps, schema_editor):
+    StudentRepositoryPublicKey = apps.get_model('learn_python_server', 'StudentRepositoryPublicKey')
+
+    def update(key):
+        key.key = serialization.load_der_public_key(bytes(key.key)).public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+
+    paged_bulk_update(
+        StudentRepositoryPublicKey.objects.only('pk', 'key'),
+        ['key'],
+        update
+    )
+
+
+def dedupe(apps, schema_editor):
+    # the same key may have been stored twice for a repository before the
+    # unique constraint existed
+    StudentRepositoryPublicKey = apps.get_model('learn_python_server', 'StudentRepositoryPublicKey')
+    seen = set()
+    duplicates = []
+    for pk, repository_id, fingerprint in StudentRepositoryPublicKey.objects.order_by(
+        'pk'
+    ).values_list('pk', 'repository_id', 'fingerprint').iterator():
+        if (repository_id, bytes(fingerprint)) in seen:
+            duplicates.append(pk)
+        seen.add((repository_id, bytes(fingerprint)))
+    StudentRepositoryPublicKey.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn_python_server', '0004_timelineevent_log_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentrepositorypublickey',
+            name='fingerprint',
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+        migrations.RunPython(pem_to_der, der_to_pem),
+        migrations.RunPython(dedupe, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='studentrepositorypublickey',
+            name='fingerprint',
+            field=models.BinaryField(help_text='The SHA-256 digest of the DER encoded key.', max_length=32, validators=[django.core.validators.MinLengthValidator(32), django.core.validators.MaxLengthValidator(32)]),
+        ),
+        migrations.AlterField(
+            model_name='studentrepositorypublickey',
+            name='key',
+            field=models.BinaryField(help_text='The DER encoded SubjectPublicKeyInfo.'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='studentrepositorypublickey',
+            unique_together={('repository', 'fingerprint')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-15 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('learn_python_server', '0005_studentrepositorypublickey_der_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courserepositoryversion',
+            name='structure',
+            field=models.JSONField(blank=True, default=None, help_text='The course structure reported by the repository at this version.', null=True),
+        ),
+    ]
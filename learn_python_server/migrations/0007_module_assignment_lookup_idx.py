@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-15 17:05
+
+from django.db import migrations, models
+
+from learn_python_server.migrations._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('learn_python_server', '0006_courserepositoryversion_structure'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='module',
+            index=models.Index(fields=['repository', 'name'], name='module_repo_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='assignment',
+            index=models.Index(fields=['identifier', 'module'], name='assignment_identifier_idx'),
+        ),
+    ]
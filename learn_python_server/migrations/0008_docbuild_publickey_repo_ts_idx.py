@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:07
+
+from django.db import migrations, models
+
+from learn_python_server.migrations._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('learn_python_server', '0007_module_assignment_lookup_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='docbuild',
+            index=models.Index(fields=['repository', '-timestamp'], name='docbuild_repo_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='studentrepositorypublickey',
+            index=models.Index(fields=['repository', '-timestamp'], name='publickey_repo_ts_idx'),
+        ),
+    ]
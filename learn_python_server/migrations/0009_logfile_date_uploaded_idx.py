@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:41
+
+from django.db import migrations, models
+
+from learn_python_server.migrations._operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('learn_python_server', '0008_docbuild_publickey_repo_ts_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='logfile',
+            index=models.Index(fields=['-date', '-uploaded_at'], name='logfile_date_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+"""
+Helpers for data migrations. Backfills should never iterate over a whole table
+calling save() on every row - use these instead.
+"""
+from django.db import transaction
+
+
+def paged_bulk_update(queryset, fields, update, batch_size=1000):
+    """
+    Walk the queryset in primary key order, batch_size rows at a time, calling
+    update(obj) on each object and writing the given fields back with a single
+    bulk_update per page. Use only() on the queryset to avoid loading columns
+    update() does not need.
+
+    If the new value of a field can be expressed as a handful of distinct
+    values, a filter(...).update(...) per value is cheaper still.
+
+    :param queryset: The rows to update
+    :param fields: The names of the fields update() changes
+    :param update: A callable that modifies an object in place
+    :param batch_size: The number of rows to load and update at a time
+    :return: The number of rows updated
+    """
+    model = queryset.model
+    pk = model._meta.pk.attname
+    queryset = queryset.order_by(pk)
+    last = None
+    updated = 0
+    while page := list(
+        (queryset.filter(pk__gt=last) if last is not None else queryset)[:batch_size]
+    ):
+        for obj in page:
+            update(obj)
+        with transaction.atomic(using=queryset.db):
+            updated += model._base_manager.using(queryset.db).bulk_update(
+                page,
+                fields,
+                batch_size=batch_size
+            )
+        last = page[-1].pk
+    return updated
@@ -0,0 +1,79 @@
+"""
+Custom migration operations. This module is prefixed with an underscore so the
+migration loader does not mistake it for a migration.
+"""
+from django.db.migrations.operations import AddIndex, RemoveIndex
+
+
+def _concurrently(schema_editor):
+    return (
+        schema_editor.connection.vendor == 'postgresql' and
+        not schema_editor.connection.in_atomic_block
+    )
+
+
+class AddIndexConcurrently(AddIndex):
+    """
+    Add an index without locking out writes to the table while it builds. On
+    PostgreSQL this uses CREATE INDEX CONCURRENTLY, which requires the migration
+    to be non-atomic (atomic = False). On other backends, or if we find ourselves
+    in a transaction anyway, this is a normal AddIndex.
+    """
+
+    atomic = False
+
+    def describe(self):
+        return 'Concurrently create index {} on field(s) {} of model {}'.format(
+            self.index.name,
+            ', '.join(self.index.fields),
+            self.model_name
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrently(schema_editor):
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrently(schema_editor):
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class RemoveIndexConcurrently(RemoveIndex):
+    """
+    The inverse of AddIndexConcurrently - drop an index without blocking writes.
+    """
+
+    atomic = False
+
+    def describe(self):
+        return 'Concurrently remove index {} from {}'.format(self.name, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(
+                self.name
+            )
+            if _concurrently(schema_editor):
+                schema_editor.remove_index(model, index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(
+                self.name
+            )
+            if _concurrently(schema_editor):
+                schema_editor.add_index(model, index, concurrently=True)
+            else:
+                schema_editor.add_index(model, index)
@@ -1,21 +1,28 @@
 import base64
 import gzip
+import hashlib
+import io
 import json
+import logging
 import os
 import re
 import subprocess
 import time
+from collections import deque
 from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Optional, TextIO
+from typing import Any, Optional, TextIO, Union
 
 from cryptography.exceptions import InvalidSignature
-from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import (
     serialization as crypto_serialization,
 )
 from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
 from dateutil.parser import ParserError
 from dateutil.parser import parse as ts_parse
 from django.apps import apps
@@ -25,9 +32,10 @@ from django.contrib.auth.models import (
     PermissionsMixin,
     UserManager,
 )
+from django.core.cache import cache
 from django.core.exceptions import SuspiciousOperation, ValidationError
 from django.core.validators import MaxLengthValidator, MinLengthValidator
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
@@ -39,6 +47,8 @@ from django.urls import reverse
 from django.contrib.admin.utils import NestedObjects
 from django.db.models import deletion
 
+git_logger = logging.getLogger('learn_python_server.git')
+
 
 def NON_POLYMORPHIC_CASCADE(collector, field, sub_objs, using):
     return models.CASCADE(collector, field, sub_objs.non_polymorphic(), using)
@@ -63,15 +73,17 @@ class User(PolymorphicModel, AbstractUser, PermissionsMixin):
 
     objects = PolymorphicUserManager()
 
+    # maxsplit=1 only splits off the word we want instead of tokenizing the
+    # whole name
     @property
     def first_name(self):
-        if self.full_name:
-            return self.full_name.split()[0]
+        if names := (self.full_name or '').split(maxsplit=1):
+            return names[0]
         return ''
     
     @property
     def last_name(self):
-        names = self.full_name.split()
+        names = (self.full_name or '').rsplit(maxsplit=1)
         if len(names) > 1:
             return names[-1]
         return ''
@@ -118,6 +130,68 @@ def date_now():
     return now().date()
 
 
+def _trailing_json(output):
+    """
+    Parse the JSON object at the end of the given output, ignoring anything
+    written before it.
+
+    :param output: The str output of a subprocess
+    :return: The decoded object
+    :raises json.JSONDecodeError: if the output does not end with a JSON object
+    """
+    try:
+        return json.loads(output)
+    except json.JSONDecodeError as err:
+        error = err
+    decoder = json.JSONDecoder()
+    output = output.rstrip()
+    start = output.rfind('{')
+    while start != -1:
+        try:
+            obj, end = decoder.raw_decode(output, start)
+            if end == len(output):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        start = output.rfind('{', 0, start)
+    raise error
+
+
+def _tail_output(args, lines=1, **kwargs):
+    """
+    Run a command like subprocess.check_output but only keep the last few non-blank
+    lines of its output in memory - builds can be very chatty.
+
+    :param args: The command to run
+    :param lines: The number of trailing lines to keep
+    :param kwargs: Passed through to Popen
+    :return: The trailing lines joined by newlines
+    :raises: subprocess.CalledProcessError if the command fails
+    """
+    with subprocess.Popen(args, stdout=subprocess.PIPE, **kwargs) as proc:
+        tail = deque((line for line in proc.stdout if line.strip()), maxlen=lines)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+    return ''.join(tail).strip()
+
+
+def _security_check(repo):
+    """
+    Make sure the repository's virtual environment lives inside its clone. A venv
+    that has already passed in the current context is not checked again.
+    """
+    # can't use the repo_guarded venv() b/c infinite recursion
+    repo_venv = repo._poetry_venv()
+    if repo_venv == repo._checked_venv:
+        return
+    if not Path(repo_venv).resolve().is_relative_to(repo._resolved_local):
+        raise SuspiciousOperation(_(
+            'Attempted to use virtual environment {} for repository at: {}'
+        ).format(repo_venv, repo.local)
+    )
+    repo._checked_venv = repo_venv
+
+
 def repo_guard(func):
     """
     Make sure any repository functions are called within the context of the repository and
@@ -134,35 +208,12 @@ def repo_guard(func):
         and host kernel.
     """
     def wrapper(self, *args, **kwargs):
-
-        # can't use the repo_guarded version b/c infinite recursion
-        def venv():
-            try:
-                return Path(subprocess.check_output(
-                    [settings.POETRY, 'env', 'info', '--path']
-                    ).decode().strip()
-                )
-            except subprocess.CalledProcessError:
-                # this means poetry has not created a venv yet and since its
-                # clearly not using the server runtime, we just return the local
-                # repo clone directory so that our check can pass
-                return self.local
-
-        def security_check():
-            repo_path = self.local
-            repo_venv = venv()
-            if not str(Path(repo_venv).resolve()).startswith(str(Path(repo_path).resolve())):
-                raise SuspiciousOperation(_(
-                    'Attempted to use virtual environment {} for repository at: {}'
-                ).format(repo_venv, repo_path)
-            )
-
         if self._in_context:
-            security_check()
+            _security_check(self)
             return func(self, *args, **kwargs)
         else:
             with self:
-                security_check()
+                _security_check(self)
                 return func(self, *args, **kwargs)
 
     return wrapper
@@ -177,12 +228,70 @@ class Repository:
     Only tested on github right now but should probably also support gitlab.
     """
 
-    BRANCH_RE = re.compile(r'(?:tree/(?P<branch>.*))?$')
-    URI_RE = re.compile('https://(?P<domain>github).com/(?P<handle>[^/]+)/(?P<repo>[^/]+)(?:/tree/(?P<branch>.*))?$')
+    # the uri shape parse_uri() accepts - use with fullmatch()
+    URI_RE = re.compile(r'https://(?P<domain>github)\.com/(?P<handle>[^/]+)/(?P<repo>[^/]+)(?:/tree/(?P<branch>.*))?')
+
+    GITHUB_PREFIX = 'https://github.com/'
+
+    @staticmethod
+    def parse_uri(uri):
+        """
+        Split a repository uri into the named parts of URI_RE (domain, handle, repo
+        and branch) and its root with plain string operations.
+
+        :param uri: The repository uri
+        :return: A dictionary of the uri parts or None if the uri is not valid
+        """
+        if not uri or not uri.startswith(Repository.GITHUB_PREFIX):
+            return None
+        parts = uri[len(Repository.GITHUB_PREFIX):].split('/', 3)
+        if (
+            len(parts) not in (2, 4) or
+            not (parts[0] and parts[1]) or
+            (len(parts) == 4 and parts[2] != 'tree')
+        ):
+            return None
+        return {
+            'domain': 'github',
+            'handle': parts[0],
+            'repo': parts[1],
+            'branch': parts[3] if len(parts) == 4 else None,
+            'root': '{}{}/{}'.format(Repository.GITHUB_PREFIX, parts[0], parts[1])
+        }
 
     @staticmethod
     def is_valid(uri):
-        return Repository.URI_RE.match(uri)
+        return Repository.parse_uri(uri)
+
+    @staticmethod
+    def map_parallel(repositories, method, *args, jobs=8, **kwargs):
+        """
+        Call the named method on each of the given repositories concurrently. The
+        work is dominated by git and poetry subprocesses so threads are plenty. Guarded
+        methods clone the repository themselves if they need to.
+
+        :param repositories: An iterable of repositories (e.g. a queryset)
+        :param method: The name of the method to call on each repository
+        :param jobs: The maximum number of repositories to work on at once
+        :yield: (repository, result, exception) tuples in the order they finish -
+            exception is None on success, result is None on failure
+        """
+        def call(repository):
+            try:
+                return getattr(repository, method)(*args, **kwargs)
+            finally:
+                # each worker thread gets its own database connection
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            futures = {
+                pool.submit(call, repository): repository for repository in repositories
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as err:
+                    yield futures[future], None, err
     
     uri: str = ''
 
@@ -190,10 +299,15 @@ class Repository:
         self.uri = uri
 
     # repo execution context cache
-    _cwd = None
-    _venv = None
+    _env = None
+    _venv_path = None
+    _resolved_local = None
+    _checked_venv = None
     _in_context = False
-    _virtualenvs_in_project = None
+
+    # the clone does not move under us so we only ask git once - cleared
+    # whenever we clone or leave the repository context
+    _git_cache = None
 
     def path(self, stem):
         """
@@ -205,139 +319,322 @@ class Repository:
         assert self.local, 'Repository has not been cloned.'
         return self.local / Path(stem)
 
-    @property
+    def _parse(self):
+        """
+        Parse the uri once and store root, branch, handle and name directly on
+        the instance so later reads are plain attribute lookups.
+
+        :return: The parsed uri parts or None if the uri is not valid
+        """
+        parts = self.parse_uri(self.uri)
+        self.__dict__.update(
+            root=(parts or {}).get('root', self.uri),
+            branch=(parts or {}).get('branch', None),
+            handle=(parts or {}).get('handle', None),
+            name=(parts or {}).get('repo', None)
+        )
+        return parts
+
+    @cached_property
     def root(self):
         """Get's the root repository without any branches"""
-        return self.BRANCH_RE.sub('', self.uri).rstrip('/')
-    
+        self._parse()
+        return self.__dict__['root']
+
     @cached_property
     def branch(self):
         """Get's the branch name from the uri"""
-        self.BRANCH_RE.search(self.uri).groupdict()['branch']
+        self._parse()
+        return self.__dict__['branch']
     
     @cached_property
     def handle(self):
         """Get's the user handle name from the uri"""
-        return self.URI_RE.search(self.uri).groupdict()['handle']
+        self._parse()
+        return self.__dict__['handle']
 
     @cached_property
     def name(self):
         """Get's the repo name from the uri"""
-        return self.URI_RE.search(self.uri).groupdict()['repo']
+        self._parse()
+        return self.__dict__['name']
     
     def clean(self):
         super().clean()
         self.uri = normalize_url(self.uri)
-        if not self.URI_RE.match(self.uri):
+        if not self._parse():
             raise ValidationError({
                 'uri': _('Invalid repository URI. Only github supported currently.')
             })
 
     _clone = None
+    _clone_depth = None
 
     @property
     def local(self):
         return self._clone
     
-    def clone(self, path):
+    @property
+    def mirror_path(self):
+        """
+        The path of this repository's bare mirror if settings.GIT_MIRROR_DIR is set,
+        None otherwise.
+        """
+        mirror_dir = getattr(settings, 'GIT_MIRROR_DIR', None)
+        if mirror_dir and self.handle and self.name:
+            return Path(mirror_dir) / self.handle / self.name
+        return None
+
+    def _refresh_mirror(self):
+        """
+        Create or update the bare mirror of this repository. The mirror is only an
+        object cache for clone() so failures are not fatal.
+
+        :return: The path to the mirror or None if there isn't a usable one.
+        """
+        mirror = self.mirror_path
+        if not mirror:
+            return None
+        try:
+            if mirror.is_dir():
+                subprocess.check_call(['git', 'fetch', '-q', '--prune'], cwd=mirror)
+            else:
+                mirror.parent.mkdir(parents=True, exist_ok=True)
+                # clone next to the mirror and move it into place so concurrent
+                # clones never see a half written mirror
+                with TemporaryDirectory(dir=mirror.parent) as tmp:
+                    tmp = Path(tmp) / self.name
+                    subprocess.check_call(
+                        ['git', 'clone', '-q', '--mirror', self.root, tmp]
+                    )
+                    try:
+                        os.rename(tmp, mirror)
+                    except OSError:
+                        pass  # someone else got there first
+        except subprocess.CalledProcessError:
+            # still not fatal, but a broken mirror means every clone is a cold one
+            git_logger.warning('Unable to refresh the git mirror at %s', mirror, exc_info=True)
+        return mirror if mirror.is_dir() else None
+
+    def clone(self, path, depth=None):
         """
         Clone a Git repository into the specified directory.
         
         :param path: The path to clone the repository into.
+        :param depth: Only fetch this many commits of history. commit_count() will
+            be wrong for shallow clones.
         :return: The path to the cloned repository.
         :raises: subprocess.CalledProcessError if the Git command fails.
         """
-        subprocess.check_call(['git', 'clone', self.root, path])
+        if (Path(path) / '.git').is_dir():
+            # we've cloned here before - only fetch what's new
+            subprocess.check_call([
+                'git', 'fetch', '--filter=blob:none',
+                *(['--depth', str(depth)] if depth else []),
+                'origin',
+                self.branch or 'HEAD'
+            ], cwd=path)
+            subprocess.check_call(
+                ['git', 'checkout', '-q', '-B', self.branch, 'FETCH_HEAD']
+                if self.branch else
+                ['git', 'reset', '-q', '--hard', 'FETCH_HEAD'],
+                cwd=path
+            )
+        else:
+            # blobless clone - we get the full commit history (commit_count needs it)
+            # but only download file contents for the commit we check out. Objects
+            # already in the mirror are copied from it instead of downloaded. The
+            # clone dissociates so a later fetch or gc of the mirror cannot pull
+            # objects out from under it.
+            mirror = self._refresh_mirror()
+            subprocess.check_call([
+                'git', 'clone', '--filter=blob:none',
+                *(['--depth', str(depth)] if depth else []),
+                *(['--reference-if-able', str(mirror), '--dissociate'] if mirror else []),
+                *(['--branch', self.branch] if self.branch else []),
+                self.root,
+                path
+            ])
         self._clone = Path(path)
-        if self.branch:
-            # todo checkout branch
-            subprocess.check_call(['git', 'checkout', self.branch])
+        self._git_cache = {}
         return self
     
+    def _git_cached(self, key, query):
+        """
+        Memoize the result of a git query for the current clone. The clone is only
+        checked for on a miss.
+        """
+        if self._git_cache is None or key not in self._git_cache:
+            if not self.local or not self.local.exists():
+                raise RuntimeError('Repository has not been cloned.')
+            if self._git_cache is None:
+                self._git_cache = {}
+            self._git_cache[key] = query()
+        return self._git_cache[key]
+
     def commit_count(self):
-        if not self.local or not self.local.exists():
-            raise RuntimeError('Repository has not been cloned.')
-        return int(
+        return self._git_cached('count', lambda: int(
             subprocess.check_output(
                 ['git', 'rev-list', '--all', '--count'],
                 cwd=self.local
             ).strip()
-        )
+        ))
     
+    def _read_head(self):
+        """
+        Read the commit hash and branch name of HEAD straight out of the .git
+        directory. Fresh clones keep their refs in packed-refs or loose ref files
+        so we rarely need to ask git.
+
+        :return: A (hash, branch) tuple or None if HEAD could not be resolved.
+        """
+        git_dir = self.local / '.git'
+        if not git_dir.is_dir():
+            return None
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head, 'HEAD'  # detached
+        ref = head[5:]
+        branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+        if (loose := git_dir / ref).is_file():
+            return loose.read_text().strip(), branch
+        if (packed := git_dir / 'packed-refs').is_file():
+            for line in packed.read_text().splitlines():
+                git_hash, _, name = line.partition(' ')
+                if name == ref:
+                    return git_hash, branch
+        return None
+
+    def _head(self):
+        """The commit hash and branch name of HEAD."""
+        return self._git_cached('head', lambda: self._read_head() or tuple(
+            subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD', '--abbrev-ref', 'HEAD'],
+                cwd=self.local,
+                text=True
+            ).split()
+        ))
+
     def commit_hash(self):
-        if not self.local or not self.local.exists():
-            raise RuntimeError('Repository has not been cloned.')
-        return subprocess.check_output(
-            ['git', 'rev-parse', 'HEAD'],
-            cwd=self.local
-        ).strip().decode('utf-8')
+        return self._head()[0]
 
     def cloned_branch(self):
-        if not self.local or not self.local.exists():
-            raise RuntimeError('Repository has not been cloned.')
-        return subprocess.check_output(
-            ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-            cwd=self.local
-        ).strip().decode('utf-8')
+        return self._head()[1]
+
+    def snapshot(self):
+        """
+        Get the commit hash, branch name and commit count of the clone. HEAD is
+        usually read straight from .git so this is a single git call.
+
+        :return: A dictionary with hash, branch and count keys.
+        """
+        git_hash, branch = self._head()
+        return {'hash': git_hash, 'branch': branch, 'count': self.commit_count()}
 
     def __enter__(self):
         if not self.local:
             self._tmp_dir = TemporaryDirectory()
-            self.clone(self._tmp_dir.__enter__())
-        self._cwd = os.getcwd()
-        os.chdir(self.local)
-        self._venv = os.environ.pop('VIRTUAL_ENV', None)
-        self._virtualenvs_in_project = subprocess.check_output(
-            [settings.POETRY, 'config', 'virtualenvs.in-project']
-        ).strip().decode().lower() == 'true'
-        subprocess.check_output(
-            [settings.POETRY, 'config', 'virtualenvs.in-project', 'true']
-        )
+            self.clone(self._tmp_dir.__enter__(), depth=self._clone_depth)
+        # the environment our poetry subprocesses run in - the server's own
+        # virtual environment is hidden and poetry reads its settings from
+        # POETRY_* variables (which beat any config file) so we can force
+        # in-project venvs without touching the user's global config
+        self._env = {
+            key: value for key, value in os.environ.items() if key != 'VIRTUAL_ENV'
+        }
+        self._env['POETRY_VIRTUALENVS_CREATE'] = 'true'
+        self._env['POETRY_VIRTUALENVS_IN_PROJECT'] = 'true'
+        self._venv_path = None
+        # resolve once per context - the guard checks the venv against this
+        # before every guarded call
+        self._resolved_local = Path(self.local).resolve()
+        self._checked_venv = None
         self._in_context = True
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        subprocess.check_output([
-            settings.POETRY,
-            'config',
-            'virtualenvs.in-project',
-            'true' if self._virtualenvs_in_project else 'false'
-        ])
-        os.chdir(self._cwd)
-        if self._venv:
-            os.environ['VIRTUAL_ENV'] = self._venv
+        self._env = None
+        self._venv_path = None
+        self._resolved_local = None
+        self._checked_venv = None
         self._in_context = False
+        self._git_cache = {}
         if hasattr(self, '_tmp_dir'):
             self._tmp_dir.__exit__(exc_type, exc_val, exc_tb)
             del self._tmp_dir
+            # the clone is gone - the next context must clone again
+            self._clone = None
+
+    def _poetry_venv(self):
+        """
+        The path of the repository's virtual environment. We force poetry to
+        create in-project venvs so this is always <local>/.venv (whether or not
+        it exists yet) and we never need to ask poetry for it.
+        """
+        if self._venv_path is None:
+            self._venv_path = self.local / '.venv'
+        return self._venv_path
 
     @repo_guard
     def venv(self):
-        return Path(subprocess.check_output(
-            [settings.POETRY, 'env', 'info', '--path']
-            ).decode().strip()
-        )
+        return self._poetry_venv()
 
     @repo_guard
     def install(self):
-        return subprocess.check_output([settings.POETRY, 'install']).decode().strip()
+        """Install the repository into its venv, returns the tail of poetry's output."""
+        return _tail_output(
+            [settings.POETRY, 'install'],
+            lines=20,
+            cwd=self.local,
+            env=self._env,
+            text=True
+        )
+
+    def _poetry_run(self, script, *args, run=subprocess.check_output):
+        """
+        The equivalent of poetry run <script> <args>. If the script is installed in the
+        repository's venv we run it directly and skip poetry's own (slow) startup.
+
+        :param run: The subprocess function to run the script with
+        :return: The stdout of the script
+        """
+        venv = self._poetry_venv()
+        executable = venv / ('Scripts' if os.name == 'nt' else 'bin') / script
+        if executable.is_file():
+            return run(
+                [executable, *args],
+                cwd=self.local,
+                env={
+                    **self._env,
+                    'VIRTUAL_ENV': str(venv),
+                    'PATH': os.pathsep.join([str(executable.parent), self._env.get('PATH', '')])
+                },
+                text=True
+            )
+        return run(
+            [settings.POETRY, 'run', script, *args],
+            cwd=self.local,
+            env=self._env,
+            text=True
+        )
 
     @repo_guard
     def doc_build(self, *args):
-        return Path(subprocess.check_output(
-            [settings.POETRY, 'run', 'doc', 'build', '--no-open', *(args or ['--detached'])
-        ]).decode().strip().split('\n')[-1])
+        # the output path is the last line - relative output paths are relative to the clone
+        return self.local / self._poetry_run(
+            'doc', 'build', '--no-open', *(args or ['--detached']),
+            run=_tail_output
+        )
 
     @repo_guard
     def course_structure(self):
         # sphinx is extremely chatty and despite best efforts it might pollute stdout with some
-        # garbage - it caches lots of things so if we error out the first time, try once more 
-        # just incase, caching eliminates the problem
+        # garbage - the structure is the last thing written so dig it out of the output rather
+        # than paying for another sphinx run. Sphinx caches lots of things so if we really
+        # can't find it the first time, try once more just incase, caching eliminates the problem
         def do_get():
-            return json.loads(
-                subprocess.check_output(
-                    [settings.POETRY, 'run', 'doc', 'structure']
-                ).decode().strip() or '{}'
+            return _trailing_json(
+                self._poetry_run('doc', 'structure').strip() or '{}'
             )
         try:
             return do_get()
@@ -408,6 +705,13 @@ class CourseRepositoryVersion(RepositoryVersion):
         related_name='versions'
     )
 
+    structure = models.JSONField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_('The course structure reported by the repository at this version.')
+    )
+
     def __str__(self):
         return f'{self.repository}: {RepositoryVersion.__str__(self)}'
     
@@ -426,13 +730,14 @@ class DocBuild(models.Model):
     def sub_dir(self):
         return f'docs/{self.id}'
 
-    @property
+    @cached_property
     def path(self):
         return Path(settings.STATIC_ROOT) / self.sub_dir
     
-    @property
+    @cached_property
     def url(self):
-        root = str(Path(settings.STATIC_URL) / self.sub_dir)
+        # STATIC_URL may be a full url so no Path() here - it would eat the //
+        root = f'{settings.STATIC_URL.rstrip("/")}/{self.sub_dir}'
         if settings.DEBUG:
             return f'{root}/index.html'
         return root
@@ -441,12 +746,35 @@ class DocBuild(models.Model):
         return f'[{self.repository}] {self.path}'
 
     class Meta:
+        indexes = [
+            # courses look up the latest build of their repository
+            models.Index(fields=['repository', '-timestamp'], name='docbuild_repo_ts_idx')
+        ]
         verbose_name = _('Doc Build')
         verbose_name_plural = _('Doc Builds')
 
 
+class CourseQuerySet(models.QuerySet):
+
+    def with_latest_docs(self):
+        """
+        Annotate each course with latest_docs_id - the id of the most recent doc
+        build of its repository (or None) - so listing courses does not need a
+        query per course to find their docs.
+        """
+        return self.annotate(
+            latest_docs_id=models.Subquery(
+                DocBuild.objects.filter(
+                    repository__repository=models.OuterRef('repository')
+                ).order_by('-timestamp').values('id')[:1]
+            )
+        )
+
+
 class Course(models.Model):
 
+    objects = CourseQuerySet.as_manager()
+
     name = models.CharField(max_length=255, unique=True, db_index=True)
     description = models.TextField(null=False, default='', blank=True)
     started = models.DateField(default=date_now, editable=True)
@@ -464,9 +792,14 @@ class Course(models.Model):
         help_text=_('API key for the Tutor backend, specifically for this course.')
     )
 
-    @property
+    @cached_property
     def docs(self):
-        return DocBuild.objects.filter(repository__repository=self.repository).latest('timestamp')
+        """The most recent doc build for this course, or None if there are none."""
+        if 'latest_docs_id' in self.__dict__ and self.latest_docs_id is None:
+            return None
+        return DocBuild.objects.filter(
+            repository__repository_id=self.repository_id
+        ).order_by('-timestamp').first()
 
     def __str__(self):
         if self.name:
@@ -501,29 +834,112 @@ class Enrollment(models.Model):
         verbose_name_plural = _('Enrollments')
 
 
-class StudentRepositoryManager(models.Manager):
+# signature parameters are stateless, build them once
+_SHA256 = hashes.SHA256()
+_PREHASHED_SHA256 = Prehashed(_SHA256)
+_PSS_PADDING = padding.PSS(mgf=padding.MGF1(_SHA256), salt_length=padding.PSS.MAX_LENGTH)
 
-    @staticmethod
-    def student_from_uri(uri):
-        uri_match = Repository.is_valid(uri)
-        if uri_match:
-            return Student.objects.get_or_create(
-                domain=uri_match.groupdict()['domain'],
-                handle=uri_match.groupdict()['handle']
-            )[0]
-        return None
 
-    def get_or_create(self, **kwargs):
-        if 'student' not in kwargs:
-            kwargs['student'] = self.student_from_uri(kwargs.get('uri', None))
-        return super().get_or_create(**kwargs)
+@lru_cache(maxsize=1024)
+def _load_public_key(der):
+    """
+    Parsing is the expensive part of verification and the same few keys verify
+    every request, so keep the parsed keys around across requests.
+    """
+    return crypto_serialization.load_der_public_key(der)
+
+
+def _pem_blocks(data: bytes):
+    """
+    Yield each -----BEGIN ...----- to -----END ...----- block in the given PEM
+    data. A single forward scan - no regex.
+    """
+    start = data.find(b'-----BEGIN ')
+    while start != -1:
+        end = data.find(b'-----END ', start)
+        if end == -1:
+            return
+        end = data.find(b'-----', end + 9)
+        if end == -1:
+            return
+        end += 5
+        yield data[start:end]
+        start = data.find(b'-----BEGIN ', end)
+
+
+def _raw_delete_timeline(using, **filters):
+    """
+    Delete the timeline events matching the filters one table at a time, children
+    first, without loading them into the deletion collector. Nothing listens for
+    timeline event delete signals so the collector would only be fetching every
+    event (and its subclass rows) to delete them by primary key.
+
+    :param using: The database to delete from
+    :param filters: Filters on TimelineEvent that select the events to delete
+    """
+    timeline_models = sorted(
+        (
+            model for model in apps.get_app_config('learn_python_server').get_models()
+            if issubclass(model, TimelineEvent)
+        ),
+        key=lambda model: len(model._meta.get_parent_list()),
+        reverse=True
+    )
+    with transaction.atomic(using=using):
+        for model in timeline_models:
+            model.objects.non_polymorphic().using(using).filter(**filters)._raw_delete(using)
+
+
+class StudentRepositoryQuerySet(models.QuerySet):
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            _raw_delete_timeline(self.db, repository__in=self.values('pk'))
+            return super().delete()
+
+    def for_authentication(self):
+        """
+        Load everything signature verification and get_tutor_key() touch - the
+        repository, student, enrollment and tutor keys in one query and the public
+        keys in a second.
+        """
+        return self.select_related(
+            'student',
+            'student__tutor_key',
+            'enrollment__course__tutor_key'
+        ).prefetch_related('keys')
+
+    def get_or_create(self, defaults=None, **kwargs):
+        if 'student' not in kwargs and 'student' not in (defaults or {}):
+            # only resolve the student if we actually have to create the repository
+            try:
+                return self.get(**kwargs), False
+            except self.model.DoesNotExist:
+                defaults = {
+                    **(defaults or {}),
+                    'student': StudentRepositoryManager.student_from_uri(kwargs.get('uri', None))
+                }
+        return super().get_or_create(defaults=defaults, **kwargs)
 
     def create(self, **kwargs):
         if 'student' not in kwargs:
-            kwargs['student'] = self.student_from_uri(kwargs.get('uri', None))
+            kwargs['student'] = StudentRepositoryManager.student_from_uri(kwargs.get('uri', None))
         return super().create(**kwargs)
 
 
+class StudentRepositoryManager(models.Manager.from_queryset(StudentRepositoryQuerySet)):
+
+    @staticmethod
+    def student_from_uri(uri):
+        uri_parts = Repository.is_valid(uri)
+        if uri_parts:
+            return Student.objects.get_or_create(
+                domain=uri_parts['domain'],
+                handle=uri_parts['handle']
+            )[0]
+        return None
+
+
 class StudentRepository(RepositoryModel):
 
     student = models.ForeignKey(
@@ -535,6 +951,12 @@ class StudentRepository(RepositoryModel):
 
     objects = StudentRepositoryManager()
 
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            _raw_delete_timeline(using, repository=self)
+            return super().delete(using=using, keep_parents=keep_parents)
+
     @cached_property
     def course_repository(self):
         if hasattr(self, 'enrollment') and self.enrollment:
@@ -551,57 +973,86 @@ class StudentRepository(RepositoryModel):
     
     def synchronize_keys(self):
         keys = []
-        with self:
-            key_file = self.path('public_keys.pem')
-            if key_file.is_file():
-                with open(key_file, 'rb') as f:
-                    pem_data = f.read().decode()
-                
-                # Splitting the keys based on PEM headers/footers
-                pem_keys = [
-                    f"-----BEGIN {m[1]}-----{m[2]}-----END {m[1]}-----"
-                    for m in re.findall(
-                        r"(-----BEGIN (.*?)-----)(.*?)(-----END \2-----)",
-                        pem_data,
-                        re.S
-                    )
-                ]
-
-                keys = [
-                    crypto_serialization.load_pem_public_key(
-                        pem.encode(),
-                        backend=default_backend()
-                    ) for pem in pem_keys
-                ]
-
-        all_keys = set()
-        new_keys = set()
+        # we only need the current public_keys.pem - none of the history
+        self._clone_depth = 1
+        try:
+            with self:
+                key_file = self.path('public_keys.pem')
+                if key_file.is_file():
+                    with open(key_file, 'rb') as f:
+                        pem_data = f.read()
+                    
+                    # Splitting the keys based on PEM headers/footers
+                    keys = [
+                        crypto_serialization.load_pem_public_key(block)
+                        for block in _pem_blocks(pem_data)
+                    ]
+        finally:
+            del self._clone_depth
+
+        # fingerprint -> DER, dict preserves order and drops duplicate keys
+        wanted = {}
         for key in keys:
-            key, created = StudentRepositoryPublicKey.objects.get_or_create(
-                repository=self,
-                key=key.public_bytes(
-                    encoding=crypto_serialization.Encoding.PEM,
-                    format=crypto_serialization.PublicFormat.SubjectPublicKeyInfo
-                )
+            der = key.public_bytes(
+                encoding=crypto_serialization.Encoding.DER,
+                format=crypto_serialization.PublicFormat.SubjectPublicKeyInfo
             )
-            if created:
-                new_keys.add(key)
-            all_keys.add(key)
-        
-        # remove old keys
-        removed = StudentRepositoryPublicKey.objects.filter(
-            repository=self
-        ).exclude(pk__in=[key.pk for key in all_keys])
-        removed.delete()
-        return all_keys, new_keys, set(removed)
-
-    def verify(self, request):
+            wanted.setdefault(StudentRepositoryPublicKey.fingerprint_of(der), der)
+
+        # one query to read, two to insert and one to delete
+        with transaction.atomic():
+            existing = {
+                bytes(key.fingerprint): key
+                for key in StudentRepositoryPublicKey.objects.filter(repository=self)
+            }
+            # a concurrent sync of the same repository may beat us to a key
+            added = [fingerprint for fingerprint in wanted if fingerprint not in existing]
+            new_keys = set()
+            if added:
+                StudentRepositoryPublicKey.objects.bulk_create([
+                    StudentRepositoryPublicKey(
+                        repository=self,
+                        key=wanted[fingerprint],
+                        fingerprint=fingerprint
+                    ) for fingerprint in added
+                ], ignore_conflicts=True)
+                # ignore_conflicts leaves the instances without primary keys - read
+                # the rows back so the keys we return are saved (and hashable)
+                new_keys = set(StudentRepositoryPublicKey.objects.filter(
+                    repository=self,
+                    fingerprint__in=added
+                ))
+            removed = {
+                key for fingerprint, key in existing.items() if fingerprint not in wanted
+            }
+            if removed:
+                StudentRepositoryPublicKey.objects.filter(
+                    pk__in=[key.pk for key in removed]
+                ).delete()
+
+        all_keys = {
+            existing[fingerprint] for fingerprint in wanted if fingerprint in existing
+        } | new_keys
+        return all_keys, new_keys, removed
+
+    def verify(self, request, keys=None):
         """
         Verify that the request has been signed by a clone of this student's repository.
         We use a timestamp signing scheme to prevent replay attacks.
+
+        Clients may send the hex SHA-256 fingerprint of the DER encoded key they
+        signed with in X-LEARN-PYTHON-KEY-FP, in which case only that key is checked.
+
+        :param request: The request to verify
+        :param keys: The public keys to check, if the caller already has them.
+            Defaults to this repository's keys.
         """
         timestamp = request.META.get('HTTP_X_LEARN_PYTHON_TIMESTAMP', None)
         signature = request.META.get('HTTP_X_LEARN_PYTHON_SIGNATURE', None)
+        try:
+            fingerprint = bytes.fromhex(request.META.get('HTTP_X_LEARN_PYTHON_KEY_FP', ''))
+        except ValueError:
+            fingerprint = None  # a malformed hint is ignored, not fatal
         if timestamp and signature:
             try:
                 timestamp = int(timestamp)
@@ -609,7 +1060,40 @@ class StudentRepository(RepositoryModel):
                 return False
             if abs(int(time.time()) - timestamp) > settings.LP_REQUEST_TIMEOUT:
                 return False
-            return any((key.verify(str(timestamp), signature) for key in self.keys.all()))
+            # a signature is good for the whole timeout window so remember the
+            # ones we've checked and skip the RSA work when a client repeats one
+            cache_key = 'lp-sig:{}:{}:{}'.format(
+                self.pk,
+                timestamp,
+                hashlib.blake2b(signature.encode(), digest_size=16).hexdigest()
+            )
+            if cache.get(cache_key):
+                return True
+            # decode and hash once rather than once per candidate key
+            try:
+                raw_signature = base64.b64decode(signature)
+            except ValueError:
+                return False
+            digest = hashlib.sha256(str(timestamp).encode()).digest()
+            if keys is None and 'keys' not in getattr(self, '_prefetched_objects_cache', {}):
+                if fingerprint:
+                    # the client told us which key it used - at most one can match
+                    keys = self.keys.filter(fingerprint=fingerprint)
+                else:
+                    # the newest key is almost always the one that signed - stream
+                    # the rest so a match stops us fetching stale ones
+                    keys = self.keys.order_by('-timestamp').iterator(chunk_size=8)
+            else:
+                if keys is None:
+                    keys = self.keys.all()
+                if fingerprint:
+                    keys = [key for key in keys if bytes(key.fingerprint) == fingerprint]
+            if any((
+                key.verify(digest, raw_signature, prehashed=True)
+                for key in keys
+            )):
+                cache.set(cache_key, True, timeout=settings.LP_REQUEST_TIMEOUT)
+                return True
         return False
 
     def get_tutor_key(self):
@@ -633,42 +1117,59 @@ class StudentRepositoryPublicKey(models.Model):
         on_delete=models.CASCADE,
         related_name='keys'
     )
-    key = models.BinaryField()
+    key = models.BinaryField(help_text=_('The DER encoded SubjectPublicKeyInfo.'))
+    fingerprint = models.BinaryField(
+        max_length=32,
+        validators=[MinLengthValidator(32), MaxLengthValidator(32)],
+        help_text=_('The SHA-256 digest of the DER encoded key.')
+    )
     timestamp = models.DateTimeField(default=datetime_now, db_index=True)
 
+    @staticmethod
+    def fingerprint_of(der):
+        return hashlib.sha256(der).digest()
+
+    def save(self, *args, **kwargs):
+        self.fingerprint = self.fingerprint_of(bytes(self.key))
+        return super().save(*args, **kwargs)
+
+    @cached_property
+    def public_key(self):
+        """The deserialized public key - parsed once per instance."""
+        return _load_public_key(bytes(self.key))
+
     @cached_property
     def key_str(self):
-        return crypto_serialization.load_pem_public_key(
-            self.key,
-            backend=default_backend()
-        ).public_bytes(
+        return self.public_key.public_bytes(
             encoding=crypto_serialization.Encoding.PEM,
             format=crypto_serialization.PublicFormat.SubjectPublicKeyInfo
         ).decode('utf-8')
 
-    def verify(self, message: str, signature: str) -> bool:
+    def verify(
+        self,
+        message: Union[str, bytes],
+        signature: Union[str, bytes],
+        prehashed: bool = False
+    ) -> bool:
         """
         Verify that the given message has been signed by the corresponding private key.
         
-        :param message: The str message to verify
-        :param signature: The base64 encoded signature
+        :param message: The str message to verify, or its encoded bytes
+        :param signature: The base64 encoded signature, or the decoded signature bytes
+        :param prehashed: If True, message is the SHA-256 digest of the signed message
         :return: True if the message was signed by the private key corresponding
             to this public key.
         """
-        # load public key from binary field
-        public_key = crypto_serialization.load_pem_public_key(
-            self.key,
-            backend=default_backend()
-        )
+        if isinstance(message, str):
+            message = message.encode()
+        if isinstance(signature, str):
+            signature = base64.b64decode(signature)
         try:
-            public_key.verify(
-                base64.b64decode(signature),
-                message.encode(),
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH
-                ),
-                hashes.SHA256()
+            self.public_key.verify(
+                signature,
+                message,
+                _PSS_PADDING,
+                _PREHASHED_SHA256 if prehashed else _SHA256
             )
             return True
         except InvalidSignature:
@@ -679,6 +1180,11 @@ class StudentRepositoryPublicKey(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        unique_together = [('repository', 'fingerprint')]
+        indexes = [
+            # signatures are checked against a repository's keys newest first
+            models.Index(fields=['repository', '-timestamp'], name='publickey_repo_ts_idx')
+        ]
         verbose_name = _('Student Repository Public Key')
         verbose_name_plural = _('Student Repository Public Keys')
 
@@ -774,8 +1280,14 @@ class TimelineEvent(PolymorphicModel):
 
     class Meta:
         ordering = ('-timestamp', '-id')
-        index_together = [('timestamp', 'repository'), ('timestamp', 'repository', 'log')]
         unique_together = [('timestamp', 'repository')]
+        indexes = [
+            # per-repository timelines are filtered on repository and sorted
+            # newest first
+            models.Index(fields=['repository', '-timestamp'], name='timeline_repo_ts_idx'),
+            # events are also fetched and deleted per log file
+            models.Index(fields=['log', 'timestamp'], name='timeline_log_ts_idx')
+        ]
 
 
 class TutorExchange(TimelineEvent):
@@ -899,6 +1411,10 @@ class Module(PolymorphicModel):
     class Meta:
         ordering = ['number']
         unique_together = [('repository', 'number')]
+        indexes = [
+            # course updates look modules up by name within a repository
+            models.Index(fields=['repository', 'name'], name='module_repo_name_idx')
+        ]
         verbose_name = _('Module')
         verbose_name_plural = _('Modules')
 
@@ -947,10 +1463,19 @@ class Assignment(models.Model):
     class Meta:
         ordering = ['number']
         unique_together = [('module', 'name')]
+        indexes = [
+            # test results are matched to their assignment by identifier - once
+            # per test event when processing logs
+            models.Index(fields=['identifier', 'module'], name='assignment_identifier_idx')
+        ]
         verbose_name = _('Assignment')
         verbose_name_plural = _('Assignments')
 
 
+# the read buffer used when decompressing log files
+_LOG_READ_BUFFER_SIZE = 128 * 1024
+
+
 class LogFileManager(models.Manager):
     pass
 
@@ -960,6 +1485,37 @@ _DEFAULT_REGEX = re.compile(
     r'(?P<logger>\w+) - (?:\[(?P<level_no>\d+)\])?(?P<level>\w+) - (?P<message>.*)'
 )
 
+
+def _parse_log_timestamp(timestamp):
+    """
+    Parse a log timestamp - try the format our logs are written in before falling
+    back to dateutil's (much slower) guessing. fromisoformat() only understands our
+    +HHMM offsets on Python 3.11+, strptime covers older versions.
+    """
+    try:
+        return datetime.fromisoformat(timestamp)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S.%f%z')
+    except ValueError:
+        return ts_parse(timestamp)
+
+
+@lru_cache(maxsize=64)
+def _parse_log_level(level_no, level):
+    """
+    Resolve the level of a log line from its number or its name. Logs only use a
+    handful of levels so the answers are cached.
+    """
+    if level_no:
+        return int(level_no)
+    try:
+        return LogEvent.LogLevel(level)
+    except ValueError:
+        return LogEvent.LogLevel.NOTSET
+
+
 class LogFile(models.Model):
 
     objects = LogFileManager()
@@ -978,25 +1534,20 @@ class LogFile(models.Model):
         def unmarshall(self, params):
             if params:
                 try:
-                    params['timestamp'] = ts_parse(params['timestamp'])
+                    params['timestamp'] = _parse_log_timestamp(params['timestamp'])
                 except ParserError:
                     pass
-                try:
-                    params['level'] = (
-                        params.get('level_no', None) or
-                        LogEvent.LogLevel(params.get('level', None)) or 
-                        LogEvent.LogLevel(params.get('level_no', None))
-                    )
-                except ValueError:
-                    params['level'] = LogEvent.LogLevel.NOTSET
-                if isinstance(params['level'], str):
-                    params['level'] = int(params['level'])
+                params['level'] = _parse_log_level(
+                    params.get('level_no', None),
+                    params.get('level', None)
+                )
             return params
 
-    sha256_hash = models.CharField(
-        max_length=64,
+    sha256_bytes = models.BinaryField(
+        max_length=32,
         null=False,
-        validators=[MinLengthValidator(64), MaxLengthValidator(64)]
+        validators=[MinLengthValidator(32), MaxLengthValidator(32)],
+        help_text=_('The raw SHA-256 digest of the uploaded log file.')
     )
 
     repository = models.ForeignKey(StudentRepository, on_delete=models.CASCADE)
@@ -1022,28 +1573,54 @@ class LogFile(models.Model):
         Iterate over each message in the log file. Each message is a dictionary of 
         parameters returned by the corresponding log regex.
         """
-        log_file = None
+        log_file: 'LogFile'
 
-        file_handle: Optional[TextIO] = None
+        file_handle: Optional[TextIO]
 
         # we need to lookhead b/c multi line messages are possible
-        next_line: Optional[str] = None
-        line_no: int = -1
+        next_line: Optional[str]
+        next_line_match: Optional[re.Match]
+        line_no: int
 
         def __init__(self, log_file):
+            # all state lives on the instance so the per-line loop never falls
+            # through to the class dict
             self.log_file = log_file
-            log_file = Path(log_file.log.path)
-            if log_file.is_file():
-                if str(log_file).endswith('.gz'):
-                    self.file_handle = gzip.open(log_file, 'rt', encoding='utf-8')
+            self.file_handle = None
+            self.next_line = None
+            self.next_line_match = None
+            self.line_no = -1
+            # bind the pattern methods once - they run for every line
+            regexes = log_file.type.regexes
+            self._match = regexes[0].match
+            # a single pattern that tries each of the other regexes in order, the
+            # first that matches anywhere in the line wins - just like searching
+            # with each of them in turn but in one call
+            self._tail_match = re.compile('|'.join(
+                f'.*?(?:{regex.pattern})' for regex in regexes[1:]
+            )).match if len(regexes) > 1 else None
+            if log_file.log_exists:
+                # go through the storage backend so logs need not be on local disk
+                handle = log_file.log.storage.open(log_file.log.name, 'rb')
+                if log_file.log.name.endswith('.gz'):
+                    # gzip reads 8KB at a time by default - decompress in bigger chunks
+                    self.file_handle = io.TextIOWrapper(
+                        io.BufferedReader(
+                            gzip.GzipFile(fileobj=handle, mode='rb'),
+                            buffer_size=_LOG_READ_BUFFER_SIZE
+                        ),
+                        encoding='utf-8'
+                    )
                 else:
-                    self.file_handle = open(log_file, 'rt', encoding='utf-8')
-                self.next_line = self.file_handle.readline()
-                self.line_no += 1
+                    self.file_handle = io.TextIOWrapper(handle, encoding='utf-8')
+                self._lines = iter(self.file_handle)
+                self.readline()
 
         def readline(self):
-            self.next_line = self.file_handle.readline()
-            self.next_line_match = self.log_file.type.regexes[0].search(self.next_line)
+            self.next_line = next(self._lines, '')
+            # the lookahead match is reused as the next message's match so each
+            # line is only matched against the message regex once
+            self.next_line_match = self._match(self.next_line)
             self.line_no += 1
             return self.next_line
         
@@ -1051,40 +1628,58 @@ class LogFile(models.Model):
             if self.file_handle is None or not self.next_line:
                 raise StopIteration
             
-            match = self.log_file.type.regexes[0].search(self.next_line)
+            match = self.next_line_match
             if not match:
                 self.readline()
                 return {}
             
             def additional_params():
-                for regex in self.log_file.type.regexes[1:]:
-                    if match := regex.search(self.next_line):
-                        params.update(match.groupdict())
-                        break
+                if self._tail_match and (match := self._tail_match(self.next_line)):
+                    # groups of the alternatives that did not match are None
+                    params.update({
+                        key: value for key, value in match.groupdict().items()
+                        if value is not None
+                    })
 
             params = match.groupdict()
             additional_params()
             params['line_begin'] = self.line_no
+            continued = []
             while (next_line := self.readline()) and self.next_line_match is None:
-                params.setdefault('message', '')
-                params['message'] += f'\n{next_line}'
+                continued.append(next_line)
                 additional_params()
-            
+            if continued:
+                params['message'] = '\n'.join([params.get('message') or '', *continued])
+
             params['line_end'] = self.line_no
             return self.log_file.type.unmarshall(params)
         
+    @property
+    def sha256_hash(self):
+        """The hex representation of the SHA-256 digest."""
+        return bytes(self.sha256_bytes).hex()
+
+    @property
+    def log_exists(self):
+        """True if the uploaded log file is present in storage."""
+        return bool(self.log) and self.log.storage.exists(self.log.name)
+
     def __iter__(self):
         return self.LogIterator(self)
     
     def __str__(self):
-        return Path(self.log.path).name
+        return Path(self.log.name).name
 
     class Meta:
         ordering = ('-date', '-uploaded_at')
+        indexes = [
+            # serves the default ordering - the admin pages log files newest first
+            models.Index(fields=['-date', '-uploaded_at'], name='logfile_date_uploaded_idx')
+        ]
         verbose_name = _('Log File')
         verbose_name_plural = _('Log Files')
-        index_together = (('repository', 'sha256_hash'),)
-        unique_together = (('repository', 'sha256_hash'),)
+        index_together = (('repository', 'sha256_bytes'),)
+        unique_together = (('repository', 'sha256_bytes'),)
 
 
 class LogEvent(TimelineEvent):
@@ -1103,18 +1698,6 @@ class LogEvent(TimelineEvent):
         def __str__(self):
             return self.label
 
-        def __lt__(self, other):
-            return self.value < other.value
-        
-        def __lte__(self, other):
-            return self.value <= other.value
-        
-        def __gt__(self, other):
-            return self.value > other.value
-        
-        def __gte__(self, other):
-            return self.value >= other.value
-
     level = EnumField(LogLevel, db_index=True, strict=False)
 
     line_begin = models.PositiveIntegerField()
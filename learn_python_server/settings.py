@@ -194,6 +194,10 @@ DEFAULT_COURSE_REPOSITORY = 'https://github.com/bckohan/learn-python'
 # tempfile.TemporaryDirectory() if not set
 # TMP_DIR = BASE_DIR / 'tmp'
 
+# If set, a bare mirror of each repository is kept here and clones borrow objects from
+# it instead of downloading the whole history every time
+# GIT_MIRROR_DIR = BASE_DIR / 'mirrors'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
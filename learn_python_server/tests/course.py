@@ -64,12 +64,13 @@ class TestCourseRegistration(AddCourseMixin, StaticLiveServerTestCase):
             self.assertTrue('Read the Docs' in doc_idx.read_text())
 
         for model in [Course, CourseRepository, Module, Assignment]:
+            obj = model.objects.first()
             response = self.client.get(
                 reverse(
                     f'admin:{model._meta.label_lower.replace(".", "_")}_change',
-                    args=[model.objects.first().id]
+                    args=[obj.id]
                 )
             )
             self.assertEqual(response.status_code, 200)
             self.assertContains(response, 'Learn Python Server')
-            self.assertContains(response, str(model.objects.first()))
+            self.assertContains(response, str(obj))
@@ -61,10 +61,10 @@ class TestLogUpload(AddStudentMixin, LiveServerTestCase):
             self.student_repo.install()
             general_line_counts = []
             # ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'register']).decode().strip()
+            self.poetry_run(self.student_repo, 'register')
             try:
                 #ipdb.set_trace()
-                subprocess.check_output(['poetry', 'run', 'pytest']).decode().strip()
+                self.poetry_run(self.student_repo, 'pytest')
             except subprocess.CalledProcessError as e:
                 pass  # if tests fail we dont care
 
@@ -74,31 +74,31 @@ class TestLogUpload(AddStudentMixin, LiveServerTestCase):
             general_line_counts.append(LogFile.objects.get(type=LogFile.LogFileType.GENERAL).num_lines)
             
             #ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'delphi']).decode().strip()
+            self.poetry_run(self.student_repo, 'delphi')
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.GENERAL).count(), 1)
             general_line_counts.append(LogFile.objects.get(type=LogFile.LogFileType.GENERAL).num_lines)
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.TUTOR).count(), 1)
 
             #ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'delphi']).decode().strip()
+            self.poetry_run(self.student_repo, 'delphi')
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.GENERAL).count(), 1)
             general_line_counts.append(LogFile.objects.get(type=LogFile.LogFileType.GENERAL).num_lines)
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.TUTOR).count(), 2)
 
             #ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'delphi']).decode().strip()
+            self.poetry_run(self.student_repo, 'delphi')
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.GENERAL).count(), 1)
             general_line_counts.append(LogFile.objects.get(type=LogFile.LogFileType.GENERAL).num_lines)
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.TUTOR).count(), 3)
 
             #ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'delphi']).decode().strip()
+            self.poetry_run(self.student_repo, 'delphi')
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.GENERAL).count(), 1)
             general_line_counts.append(LogFile.objects.get(type=LogFile.LogFileType.GENERAL).num_lines)
             self.assertEqual(LogFile.objects.filter(type=LogFile.LogFileType.TUTOR).count(), 4)
 
             #ipdb.set_trace()
-            subprocess.check_output(['poetry', 'run', 'report']).decode().strip()
+            self.poetry_run(self.student_repo, 'report')
         
         #ipdb.set_trace()
         self.assertEqual(LogFile.objects.count(), 6)
@@ -132,12 +132,13 @@ class TestLogUpload(AddStudentMixin, LiveServerTestCase):
             LogFile, TutorAPIKey, TutorEngagement, 
             TutorExchange, TutorSession, LogEvent, TestEvent
         ]:
+            obj = model.objects.first()
             response = self.client.get(
                 reverse(
                     f'admin:{model._meta.label_lower.replace(".", "_")}_change',
-                    args=[model.objects.first().id]
+                    args=[obj.id]
                 )
             )
             self.assertEqual(response.status_code, 200)
             self.assertContains(response, 'Learn Python Server')
-            self.assertContains(response, str(model.objects.first()))
\ No newline at end of file
+            self.assertContains(response, str(obj))
\ No newline at end of file
@@ -0,0 +1,277 @@
+import base64
+import json
+import subprocess
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization as crypto_serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from learn_python_server.models import (
+    Repository,
+    StudentRepository,
+    StudentRepositoryPublicKey,
+    _pem_blocks,
+    _trailing_json,
+)
+from learn_python_server.utils import TemporaryDirectory
+
+
+def make_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def pem_of(*keys):
+    return b''.join(
+        key.public_key().public_bytes(
+            encoding=crypto_serialization.Encoding.PEM,
+            format=crypto_serialization.PublicFormat.SubjectPublicKeyInfo
+        ) for key in keys
+    )
+
+
+class TestParseURI(SimpleTestCase):
+
+    def test_parse_uri(self):
+        self.assertEqual(
+            Repository.parse_uri('https://github.com/bckohan/learn-python'),
+            {
+                'domain': 'github',
+                'handle': 'bckohan',
+                'repo': 'learn-python',
+                'branch': None,
+                'root': 'https://github.com/bckohan/learn-python'
+            }
+        )
+
+    def test_parse_branch(self):
+        parts = Repository.parse_uri('https://github.com/bckohan/learn-python/tree/main')
+        self.assertEqual(parts['branch'], 'main')
+        self.assertEqual(parts['root'], 'https://github.com/bckohan/learn-python')
+
+        # branch names may contain slashes
+        parts = Repository.parse_uri('https://github.com/bckohan/learn-python/tree/feature/x')
+        self.assertEqual(parts['branch'], 'feature/x')
+        self.assertEqual(parts['repo'], 'learn-python')
+
+    def test_invalid(self):
+        for uri in [
+            None,
+            '',
+            'https://github.com/bckohan',
+            'https://github.com/bckohan/learn-python/',
+            'https://github.com/bckohan/learn-python/blob/main/README.md',
+            'https://gitlab.com/bckohan/learn-python',
+            'http://github.com/bckohan/learn-python',
+            # the . in github.com is literal
+            'https://githubXcom/bckohan/learn-python',
+        ]:
+            self.assertIsNone(Repository.parse_uri(uri), uri)
+
+
+class TestPEMBlocks(SimpleTestCase):
+
+    def test_pem_blocks(self):
+        blocks = [pem_of(make_key()) for _ in range(3)]
+        data = b'junk\n' + blocks[0] + b'\nmore junk\n\n' + blocks[1] + blocks[2] + b'trailing'
+        self.assertEqual(
+            [block.strip() for block in _pem_blocks(data)],
+            [block.strip() for block in blocks]
+        )
+
+    def test_unterminated(self):
+        block = pem_of(make_key())
+        self.assertEqual(list(_pem_blocks(block + block[:40])), [block.strip()])
+        self.assertEqual(list(_pem_blocks(b'no keys here')), [])
+
+
+class TestTrailingJSON(SimpleTestCase):
+
+    def test_trailing_json(self):
+        obj = {'a': {'b': [1, 2]}, 'c': 'd'}
+        self.assertEqual(_trailing_json(json.dumps(obj)), obj)
+        self.assertEqual(
+            _trailing_json('Installing... {not json}\n' + json.dumps(obj) + '\n'),
+            obj
+        )
+
+    def test_trailing_garbage(self):
+        with self.assertRaises(json.JSONDecodeError):
+            _trailing_json('{"a": 1} done')
+        with self.assertRaises(json.JSONDecodeError):
+            _trailing_json('no json at all')
+
+
+class TestReadHead(SimpleTestCase):
+
+    def git(self, *args):
+        return subprocess.check_output(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+            cwd=self.tmp.path,
+            text=True
+        ).strip()
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = TemporaryDirectory()
+        self.git('init', '-q', '-b', 'main')
+        self.git('commit', '-q', '--allow-empty', '-m', 'first')
+        self.repo = Repository('https://github.com/bckohan/learn-python')
+        self.repo._clone = self.tmp.path
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def test_loose_ref(self):
+        self.assertEqual(self.repo._read_head(), (self.git('rev-parse', 'HEAD'), 'main'))
+
+    def test_packed_ref(self):
+        self.git('pack-refs', '--all')
+        self.assertFalse((self.tmp.path / '.git' / 'refs' / 'heads' / 'main').exists())
+        self.assertEqual(self.repo._read_head(), (self.git('rev-parse', 'HEAD'), 'main'))
+
+    def test_detached(self):
+        self.git('checkout', '-q', '--detach')
+        self.assertEqual(self.repo._read_head(), (self.git('rev-parse', 'HEAD'), 'HEAD'))
+
+    def test_not_cloned(self):
+        self.repo._clone = self.tmp.path / 'missing'
+        self.assertIsNone(self.repo._read_head())
+
+
+class TestVerify(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.repo = StudentRepository.objects.create(
+            uri='https://github.com/student/learn-python'
+        )
+        self.private_keys = [make_key(), make_key()]
+        self.keys = []
+        for private_key in self.private_keys:
+            key = StudentRepositoryPublicKey(
+                repository=self.repo,
+                key=private_key.public_key().public_bytes(
+                    encoding=crypto_serialization.Encoding.DER,
+                    format=crypto_serialization.PublicFormat.SubjectPublicKeyInfo
+                )
+            )
+            key.save()
+            self.keys.append(key)
+
+    def request(self, private_key, **headers):
+        timestamp = str(int(time.time()))
+        signature = private_key.sign(
+            timestamp.encode(),
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256()
+        )
+        return RequestFactory().get(
+            '/',
+            HTTP_X_LEARN_PYTHON_TIMESTAMP=timestamp,
+            HTTP_X_LEARN_PYTHON_SIGNATURE=base64.b64encode(signature).decode(),
+            **headers
+        )
+
+    def test_verify(self):
+        self.assertTrue(self.repo.verify(self.request(self.private_keys[0])))
+        self.assertTrue(self.repo.verify(self.request(self.private_keys[1])))
+        self.assertFalse(self.repo.verify(self.request(make_key())))
+
+    def test_fingerprint(self):
+        signed_with, other = self.keys[1], self.keys[0]
+        for keys in [None, self.keys]:
+            cache.clear()
+            self.assertTrue(self.repo.verify(
+                self.request(
+                    self.private_keys[1],
+                    HTTP_X_LEARN_PYTHON_KEY_FP=bytes(signed_with.fingerprint).hex()
+                ),
+                keys=keys
+            ))
+            cache.clear()
+            # only the key named by the fingerprint is checked
+            self.assertFalse(self.repo.verify(
+                self.request(
+                    self.private_keys[1],
+                    HTTP_X_LEARN_PYTHON_KEY_FP=bytes(other.fingerprint).hex()
+                ),
+                keys=keys
+            ))
+            cache.clear()
+            # a malformed hint is ignored
+            self.assertTrue(self.repo.verify(
+                self.request(self.private_keys[1], HTTP_X_LEARN_PYTHON_KEY_FP='not hex'),
+                keys=keys
+            ))
+
+
+class TestSynchronizeKeys(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = TemporaryDirectory()
+        self.repo = StudentRepository.objects.create(
+            uri='https://github.com/student/learn-python'
+        )
+        # point the repository at a local checkout so nothing is cloned
+        self.repo._clone = self.tmp.path
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def write_keys(self, *keys):
+        (self.tmp.path / 'public_keys.pem').write_bytes(pem_of(*keys))
+
+    def fingerprints(self, keys):
+        return {bytes(key.fingerprint) for key in keys}
+
+    def test_synchronize_keys(self):
+        key1, key2, key3 = make_key(), make_key(), make_key()
+
+        # first sync - every key is new
+        self.write_keys(key1, key2)
+        all_keys, new_keys, removed = self.repo.synchronize_keys()
+        self.assertEqual(len(all_keys), 2)
+        self.assertEqual(self.fingerprints(new_keys), self.fingerprints(all_keys))
+        self.assertFalse(removed)
+        self.assertTrue(all(key.pk for key in all_keys))
+        self.assertEqual(self.repo.keys.count(), 2)
+        first = self.fingerprints(all_keys)
+
+        # nothing changed
+        all_keys, new_keys, removed = self.repo.synchronize_keys()
+        self.assertEqual(self.fingerprints(all_keys), first)
+        self.assertFalse(new_keys)
+        self.assertFalse(removed)
+        self.assertEqual(self.repo.keys.count(), 2)
+
+        # key2 rotated out for key3
+        self.write_keys(key1, key3)
+        all_keys, new_keys, removed = self.repo.synchronize_keys()
+        self.assertEqual(len(all_keys), 2)
+        self.assertEqual(len(new_keys), 1)
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(
+            self.fingerprints(all_keys) - self.fingerprints(new_keys),
+            first - self.fingerprints(removed)
+        )
+        self.assertEqual(self.fingerprints(self.repo.keys.all()), self.fingerprints(all_keys))
+
+    def test_synchronize_keys_queries(self):
+        # the number of queries does not grow with the number of keys
+        counts = []
+        for num_keys in [1, 4]:
+            self.repo.keys.all().delete()
+            self.write_keys(*[make_key() for _ in range(num_keys)])
+            with CaptureQueriesContext(connection) as queries:
+                all_keys, new_keys, removed = self.repo.synchronize_keys()
+            self.assertEqual(len(new_keys), num_keys)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
@@ -1,4 +1,3 @@
-import subprocess
 from pathlib import Path
 
 import yaml
@@ -23,7 +22,7 @@ class AddStudentMixin(AddCourseMixin):
     def setUp(self):
         super().setUp()
 
-        match = Repository.URI_RE.search(settings.TEST_STUDENT_REPO)
+        match = Repository.URI_RE.fullmatch(settings.TEST_STUDENT_REPO)
         self.assertTrue(match)
         self.domain = match.group('domain')
         self.handle = match.group('handle')
@@ -31,7 +30,11 @@ class AddStudentMixin(AddCourseMixin):
         with Repository(settings.TEST_STUDENT_REPO) as repo:
             repo.install()
             self.configure(repo)
-            subprocess.check_output(['poetry', 'run', 'register']).decode().strip()
+            self.poetry_run(repo, 'register')
+
+    def poetry_run(self, repo, *args):
+        # runs installed scripts straight from the venv, skipping poetry's startup
+        return repo._poetry_run(*args).strip()
 
     def configure(self, repo):
         with open(repo.path('.config.yaml'), 'w') as file:
@@ -56,15 +59,16 @@ class TestStudentRegistration(AddStudentMixin, LiveServerTestCase):
 
         # test admins
         for model in [Student, StudentRepository]:
+            obj = model.objects.first()
             response = self.client.get(
                 reverse(
                     f'admin:{model._meta.label_lower.replace(".", "_")}_change',
-                    args=[model.objects.first().id]
+                    args=[obj.id]
                 )
             )
             self.assertEqual(response.status_code, 200)
             self.assertContains(response, 'Learn Python Server')
-            self.assertContains(response, str(model.objects.first()))
+            self.assertContains(response, str(obj))
 
         enrollment, created = Enrollment.objects.get_or_create(
             student=student,
@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import os
+import shutil
+from io import BytesIO
+from pathlib import Path
+
+from django.test import SimpleTestCase
+from learn_python_server.utils import (
+    TemporaryDirectory,
+    link_or_copy,
+    normalize_repository,
+    num_lines,
+    sha256_and_num_lines,
+)
+
+
+class TestLinkOrCopy(SimpleTestCase):
+
+    def test_copytree_links(self):
+        with TemporaryDirectory() as src, TemporaryDirectory() as dst:
+            src, dst = Path(src), Path(dst)
+            (src / 'sub').mkdir()
+            (src / 'index.html').write_text('index')
+            (src / 'sub' / 'page.html').write_text('page')
+            (dst / 'index.html').write_text('stale')
+
+            shutil.copytree(src, dst, dirs_exist_ok=True, copy_function=link_or_copy)
+
+            self.assertEqual((dst / 'index.html').read_text(), 'index')
+            self.assertEqual((dst / 'sub' / 'page.html').read_text(), 'page')
+            self.assertTrue(os.path.samefile(src / 'index.html', dst / 'index.html'))
+
+
+class TestNormalizeRepository(SimpleTestCase):
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize_repository('https://GitHub.com/bckohan/learn-python.git'),
+            'https://github.com/bckohan/learn-python'
+        )
+        self.assertEqual(
+            normalize_repository('https://github.com/bckohan/./x/../learn-python/tree/main/'),
+            'https://github.com/bckohan/learn-python/tree/main'
+        )
+        # the path is never resolved against this machine's filesystem
+        self.assertEqual(normalize_repository('https://github.com'), 'https://github.com')
+
+
+class TestNumLines(SimpleTestCase):
+
+    def test_num_lines(self):
+        # big enough that the compressed file spans several read blocks
+        data = b''.join(os.urandom(64).hex().encode() + b'\n' for _ in range(50000))
+        for file in [BytesIO(data), BytesIO(gzip.compress(data))]:
+            self.assertEqual(num_lines(file), 50000)
+            self.assertEqual(file.tell(), 0)
+
+    def test_sha256_and_num_lines(self):
+        data = b''.join(os.urandom(64).hex().encode() + b'\n' for _ in range(50000))
+        # trailing padding after the gzip member must still be hashed
+        for file in [BytesIO(data), BytesIO(gzip.compress(data) + b'\0' * 8)]:
+            self.assertEqual(
+                sha256_and_num_lines(file),
+                (hashlib.sha256(file.getvalue()).digest(), num_lines(file))
+            )
+            self.assertEqual(file.tell(), 0)
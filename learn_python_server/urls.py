@@ -15,9 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.contrib.staticfiles import handlers
 from django.urls import include, path, register_converter
 from learn_python_server.api.views import (
     AuthorizeTutorView,
@@ -42,38 +40,47 @@ router.register(r'logs', LogFileViewSet, basename='logs')
 
 
 class URLConverter:
-    regex = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+    # a single character class - the $-_ range already covers digits, upper case
+    # letters, %, / and most punctuation so alternatives for them are redundant
+    regex = r'http[s]?://[!$-_a-z]+'
     placeholder = 'http://example.com'
 
-    def to_python(self, value):
-        return value
-
-    def to_url(self, value):
-        return value
+    # identity conversions - str is not a descriptor so it is called unbound
+    to_python = to_url = str
 
 
 register_converter(URLConverter, 'url')
 
 
+# routes are grouped under their literal prefixes so a request is only matched
+# against the patterns of its own section
 urlpatterns = [
     path('', redirect_latest_docs, name='redirect_latest_docs'),
-    path('docs/<str:course>', course_docs, name='course_docs'),
-    path('docs/<url:repository>', repository_docs, name='repository_docs'),
+    path('docs/', include([
+        path('<str:course>', course_docs, name='course_docs'),
+        path('<url:repository>', repository_docs, name='repository_docs'),
+    ])),
     path('register/<url:repository>', register, name='register'),
-    path('api/authorize_tutor', AuthorizeTutorView.as_view(), name='authorize_tutor'),
-    path('api/', include(router.urls)),
-    path('api/timeline', TimelineViewSet.as_view(), name='timeline'),
-    path('api/timeline/<url:uri>', TimelineViewSet.as_view(), name='timeline'),
-    path('api/timeline/<int:id>', TimelineViewSet.as_view(), name='timeline'),
-    path('api/modules/<url:uri>', ModuleViewSet.as_view(), name='modules'),
-    path('api/modules/<int:id>', ModuleViewSet.as_view(), name='modules'),
+    path('api/', include([
+        path('authorize_tutor', AuthorizeTutorView.as_view(), name='authorize_tutor'),
+        path('', include(router.urls)),
+        path('timeline', TimelineViewSet.as_view(), name='timeline'),
+        path('timeline/<url:uri>', TimelineViewSet.as_view(), name='timeline'),
+        path('timeline/<int:id>', TimelineViewSet.as_view(), name='timeline'),
+        path('modules/<url:uri>', ModuleViewSet.as_view(), name='modules'),
+        path('modules/<int:id>', ModuleViewSet.as_view(), name='modules'),
+    ])),
     path('media/log_uploads/<str:log_name>', get_log, name='get_log'),
-    path('timeline/<url:uri>', StudentRepositoryTimelineView.as_view(), name='student_timeline'),
-    path('timeline/<int:id>', StudentRepositoryTimelineView.as_view(), name='student_timeline'),
+    path('timeline/', include([
+        path('<url:uri>', StudentRepositoryTimelineView.as_view(), name='student_timeline'),
+        path('<int:id>', StudentRepositoryTimelineView.as_view(), name='student_timeline'),
+    ])),
     path('admin/', admin.site.urls)
 ]
 
 if settings.DEBUG:
+    # development only - production processes never import these
+    from django.conf.urls.static import static
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     import debug_toolbar
     urlpatterns.append(path('__debug__/', include(debug_toolbar.urls)))
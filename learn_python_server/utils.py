@@ -1,13 +1,14 @@
 import hashlib
 import os
+import posixpath
+import shutil
 import tempfile
+from functools import lru_cache
 from gzip import GzipFile
-from io import BytesIO
 from pathlib import Path
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 from django.conf import settings
-from django.utils import timezone
 from django.db import transaction, DEFAULT_DB_ALIAS
 
 
@@ -25,32 +26,52 @@ def is_gzip(file):
 
 
 def num_lines(file):
-    is_gz = False
-    def blocks(files, size=65536):
-        while True:
-            if is_gz:
-                with GzipFile(fileobj=BytesIO(files.read(size))) as d_files:
-                    b = d_files.read(size)
-            else:
-                b = files.read(size)
-            if not b:
-                break
-            yield b
-
+    """
+    Count the lines in a plain or gzipped file. Gzipped files are inflated as a
+    single stream, a gzip member cannot be decompressed in independent pieces.
+    """
     file.seek(0)
-    is_gz = is_gzip(file)
-    count = sum(buffer.count(b'\n') for buffer in blocks(file))
+    stream = GzipFile(fileobj=file, mode='rb') if is_gzip(file) else file
+    count = sum(
+        block.count(b'\n') for block in iter(lambda: stream.read(1 << 20), b'')
+    )
     file.seek(0)
     return count
 
 
-def calculate_sha256(file_handle):
+class _HashingReader:
+    """A read-only file wrapper that feeds everything read through a hasher."""
+
+    def __init__(self, file, hasher):
+        self.file = file
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def sha256_and_num_lines(file):
+    """
+    The SHA-256 digest and line count (see num_lines) of a file in one pass. The
+    digest is of the raw bytes, the lines are counted after inflating gzipped files.
+
+    :param file: A binary file object
+    :return: A tuple of the raw SHA-256 digest and the number of lines
+    """
+    file.seek(0)
     sha256_hash = hashlib.sha256()
-    file_handle.seek(0)
-    for byte_block in iter(lambda: file_handle.read(4096), b''):
-        sha256_hash.update(byte_block)
-    file_handle.seek(0)
-    return sha256_hash.hexdigest()
+    reader = _HashingReader(file, sha256_hash)
+    stream = GzipFile(fileobj=reader, mode='rb') if is_gzip(file) else reader
+    count = sum(
+        block.count(b'\n') for block in iter(lambda: stream.read(1 << 20), b'')
+    )
+    # hash anything gzip left unread, like trailing padding
+    for _ in iter(lambda: reader.read(1 << 20), b''):
+        pass
+    file.seek(0)
+    return sha256_hash.digest(), count
 
 
 def headers_match(file1, file2, check_size):
@@ -65,16 +86,34 @@ def headers_match(file1, file2, check_size):
     return check_size == 0
 
 
+def link_or_copy(src, dst):
+    """
+    A copy_function for shutil.copytree that hardlinks files instead of copying
+    their contents. Falls back to a real copy if the link cannot be made (e.g.
+    the source and destination are on different filesystems).
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.unlink(dst)
+        return link_or_copy(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
 class TemporaryDirectory(tempfile.TemporaryDirectory):
     
     def __init__(self, **kwargs):
-        dir = kwargs.pop('dir', getattr(settings, 'TMP_DIR', None))
-        if dir:
-            os.makedirs(dir, exist_ok=True)
+        # TMP_DIR is created once when the app is loaded
+        kwargs.setdefault('dir', getattr(settings, 'TMP_DIR', None))
         super().__init__(**kwargs)
         self.path = Path(self.name)
 
 
+# repository urls are normalized on every authenticated request and students
+# send the same one over and over
+@lru_cache(maxsize=4096)
 def normalize_repository(repository):
     norm_url = normalize_url(repository)
     if norm_url.endswith('.git'):
@@ -82,12 +121,13 @@ def normalize_repository(repository):
     return norm_url
 
 
+@lru_cache(maxsize=4096)
 def normalize_url(url):
     # Parse the URL into its components
     parsed = urlparse(url)
 
-    # Normalize the path
-    path = Path(parsed.path).resolve().as_posix()
+    # Normalize the path - lexically, this is a url not a file on this machine
+    path = posixpath.normpath(parsed.path) if parsed.path else ''
 
     # Normalize the query parameters (sort them)
     query = urlencode(sorted(parse_qsl(parsed.query)))
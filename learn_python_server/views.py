@@ -1,5 +1,3 @@
-import os
-
 from django.conf import settings
 from django.db.models import Q
 from django.http import (
@@ -12,8 +10,10 @@ from django.http import (
     JsonResponse,
 )
 from django.utils.translation import gettext_lazy as _
+from django.views.decorators.cache import cache_control
 from django.views.generic import TemplateView
 from learn_python_server.models import (
+    Course,
     DocBuild,
     LogFile,
     StudentRepository,
@@ -23,11 +23,15 @@ from learn_python_server.utils import normalize_repository
 
 
 def course_docs(request, course):
-    qry = Q(repository__repository__courses__name=course)
+    qry = Q(name=course)
     if course.isdigit():
-        qry |= Q(repository__repository__courses__id=int(course))
-    
-    docs = DocBuild.objects.filter(qry).order_by('-timestamp').distinct().first()
+        qry |= Q(id=int(course))
+
+    # resolve the course in a subquery so the OR stays on the course table's own
+    # indexes and there is no join fan out to de-duplicate
+    docs = DocBuild.objects.filter(
+        repository__repository__in=Course.objects.filter(qry).values('repository')
+    ).order_by('-timestamp').first()
     if docs:
         return HttpResponseRedirect(redirect_to=docs.url)
     return HttpResponseNotFound()
@@ -41,10 +45,14 @@ def repository_docs(request, repository):
     return HttpResponseNotFound()
 
 
+# the landing page - let browsers and proxies hold the redirect briefly, a new
+# doc build only needs to show up within a minute
+@cache_control(public=True, max_age=60)
 def redirect_latest_docs(request):
-    latest = DocBuild.objects.order_by('-timestamp').first()
-    if latest:
-        return HttpResponseRedirect(redirect_to=latest.url)
+    # the url is derived from the id alone - walk the timestamp index for it
+    latest = DocBuild.objects.order_by('-timestamp').values_list('id', flat=True).first()
+    if latest is not None:
+        return HttpResponseRedirect(redirect_to=DocBuild(id=latest).url)
     return HttpResponse()
 
 
@@ -54,6 +62,15 @@ def register(request, repository):
     repository when it is ready to be registered. It will verify that the public API keys
     exist and that the signature of the request is valid.
     """
+    # cheapest checks first - an unsigned request can be turned away before we touch
+    # the database or fetch the repository's keys from the network
+    if not (
+        request.META.get('HTTP_X_LEARN_PYTHON_TIMESTAMP')
+        and request.META.get('HTTP_X_LEARN_PYTHON_SIGNATURE')
+    ):
+        return HttpResponseForbidden(
+            _('Registration of {} is not signed.').format(repository)
+        )
     repository = normalize_repository(repository)
     if not StudentRepository.is_valid(repository):
         return HttpResponse(
@@ -68,7 +85,7 @@ def register(request, repository):
         return HttpResponse(status=400, content=_('No public keys found.'))
     
     repo.refresh_from_db()
-    if not repo.verify(request):
+    if not repo.verify(request, keys=all_keys):
         return HttpResponseForbidden(
             _('Registration of {} has invalid signature.').format(repository)
         )
@@ -77,31 +94,26 @@ def register(request, repository):
     # object associating this student with a course, but their is no repository associated
     # with the course, then we can assume we should automatically enroll this repository/student
     # in the course
-    pending_enrollments = repo.student.enrollments.filter(repository__isnull=True)
-    if pending_enrollments.count() == 1:
-        enroll = pending_enrollments.first()
+    # fetching two is enough to tell if there is exactly one - no separate count query
+    pending_enrollments = list(repo.student.enrollments.filter(repository__isnull=True)[:2])
+    if len(pending_enrollments) == 1:
+        enroll = pending_enrollments[0]
         enroll.repository = repo
         enroll.save()
         repo.refresh_from_db()
 
     tutor_api_key = repo.get_tutor_key()
-
-    if repo.verify(request):
-        return JsonResponse(
-            data={
-                'server': f'{request.scheme}://{request.get_host()}',
-                'registered': True,
-                'enrollment': (
-                    repo.enrollment.course.name
-                    if hasattr(repo, 'enrollment') and repo.enrollment else
-                    None
-                ),
-                'tutor': tutor_api_key.backend.value if tutor_api_key else None,
-            },
-            status=201
-        )
-    return HttpResponseForbidden(
-        _('Registration of {} has invalid signature.').format(repository)
+    enrollment = getattr(repo, 'enrollment', None)
+
+    # the signature was verified above - enrolling does not change the keys
+    return JsonResponse(
+        data={
+            'server': f'{request.scheme}://{request.get_host()}',
+            'registered': True,
+            'enrollment': enrollment.course.name if enrollment else None,
+            'tutor': tutor_api_key.backend.value if tutor_api_key else None,
+        },
+        status=201
     )
 
 
@@ -110,19 +122,25 @@ def get_log(request, log_name):
         if log_name.isdigit():
             log_file = LogFile.objects.get(id=int(log_name))
         else:
-            log_file = LogFile.objects.get(log__icontains=log_name)
-        if (
-            os.path.exists(log_file.log.path) and (
-                (request.user.is_staff or request.user.is_superuser)
-                or (
-                    log_file.repository in StudentRepository.objects.filter(student__in=request.user.students.all())
-                    or log_file.repository == request.user.authorized_repository
-                )
+            # the url mirrors the storage path, match the stored name exactly
+            log_file = LogFile.objects.get(
+                log=f'{LogFile._meta.get_field("log").upload_to}/{log_name}'
+            )
+        if log_file.log and (
+            (request.user.is_staff or request.user.is_superuser)
+            or log_file.repository_id == getattr(
+                getattr(request.user, 'authorized_repository', None), 'id', None
             )
+            or StudentRepository.objects.filter(
+                id=log_file.repository_id,
+                student__in=request.user.students.all()
+            ).exists()
         ):
-            return FileResponse(log_file.log.open(), content_type='application/gzip')
+            # just open it - checking the storage first is an extra round trip that
+            # can still race with a delete
+            return FileResponse(log_file.log.open('rb'), content_type='application/gzip')
         raise Http404()
-    except LogFile.DoesNotExist as err:
+    except (LogFile.DoesNotExist, FileNotFoundError) as err:
         raise Http404() from err
 
 
@@ -132,11 +150,13 @@ class StudentRepositoryTimelineView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        # the page shows the student and the course, fetch them with the repository
+        repositories = StudentRepository.objects.select_related('student', 'enrollment__course')
         try:
             if 'uri' in kwargs:
-                context['repository'] = StudentRepository.objects.get(uri=kwargs['uri'])
+                context['repository'] = repositories.get(uri=kwargs['uri'])
             elif 'id' in kwargs:
-                context['repository'] = StudentRepository.objects.get(id=kwargs['id'])
+                context['repository'] = repositories.get(id=kwargs['id'])
             else:
                 # todo - unified timeline?
                 raise Http404()